@@ -0,0 +1,121 @@
+"""In-memory activity feed for observers.
+
+The last ``ACTIVITY_FEED_SIZE`` platform events (registrations, matches,
+messages, unmatches, read receipts) are kept in a ring buffer, each under a
+monotonically increasing offset. ``/observer/feed`` pages through it and
+observer sockets replay from the last offset they saw after reconnecting,
+so dashboards render from memory instead of querying the database.
+
+Offsets start from the current time in microseconds, so they keep growing
+across restarts and a stale offset never hides newer events.
+
+Each worker numbers its own feed: with several workers (``BROADCAST_URL``
+fan-out) an offset only means something to the worker that issued it. An
+offset this feed has not reached yet is treated as unknown, so a client that
+resumes on another worker is told it may have missed events.
+"""
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Deque, List, Optional, Tuple
+
+import config
+import events
+from schemas import ActivityFeedItem
+
+
+class ActivityFeed:
+    """Bounded ring buffer of (offset, event)"""
+
+    def __init__(self, max_items: int = 1000):
+        self._items: Deque[Tuple[int, dict]] = deque(maxlen=max_items)
+        self._next_offset = time.time_ns() // 1000
+
+    @property
+    def head(self) -> int:
+        """Offset of the newest event (or just before the first one to come)"""
+        return self._next_offset - 1
+
+    @property
+    def oldest(self) -> Optional[int]:
+        return self._items[0][0] if self._items else None
+
+    def append(self, event: dict) -> int:
+        offset = self._next_offset
+        self._next_offset += 1
+        self._items.append((offset, event))
+        return offset
+
+    # Offsets are contiguous, so an offset maps straight to a buffer index
+
+    def since(self, offset: int, limit: Optional[int] = None) -> List[Tuple[int, dict]]:
+        """Events after ``offset``, oldest first"""
+        if not self._items:
+            return []
+        # Clamped: islice rejects indexes past sys.maxsize
+        start = min(max(0, offset + 1 - self._items[0][0]), len(self._items))
+        stop = None if limit is None else start + limit
+        return list(islice(self._items, start, stop))
+
+    def covers(self, offset: int) -> bool:
+        """True if no event after ``offset`` has been evicted yet
+
+        Offsets past ``head`` come from another worker or incarnation, so
+        nothing is known about what followed them.
+        """
+        if offset > self.head:
+            return False
+        return not self._items or offset >= self._items[0][0] - 1
+
+    def page(self, limit: int, before: Optional[int] = None) -> List[Tuple[int, dict]]:
+        """Up to ``limit`` events older than ``before`` (default: newest), newest first"""
+        if not self._items:
+            return []
+        stop = len(self._items)
+        if before is not None:
+            stop = max(0, min(stop, before - self._items[0][0]))
+        page = list(islice(self._items, max(0, stop - limit), stop))
+        page.reverse()
+        return page
+
+
+def _name(event: dict, agent_id: Optional[str]) -> str:
+    return event.get("agent_names", {}).get(agent_id) or "An agent"
+
+
+def describe(event: dict) -> str:
+    """Human-readable one-liner for an observer event"""
+    kind = event.get("type")
+    if kind == events.AGENT_REGISTERED:
+        return f"{_name(event, event.get('agent_id'))} joined Moltender"
+    if kind == events.NEW_MATCH:
+        return f"{_name(event, event.get('agent1_id'))} matched with {_name(event, event.get('agent2_id'))}"
+    if kind == events.NEW_MESSAGE:
+        return f"{_name(event, event.get('sender_id'))} sent a message to {_name(event, event.get('recipient_id'))}"
+    if kind == events.MESSAGES_READ:
+        return f"{_name(event, event.get('reader_id'))} read messages from {_name(event, event.get('sender_id'))}"
+    if kind == events.UNMATCH:
+        other = event.get("agent2_id") if event.get("removed_by") == event.get("agent1_id") else event.get("agent1_id")
+        return f"{_name(event, event.get('removed_by'))} unmatched {_name(event, other)}"
+    return kind or "activity"
+
+
+def to_item(offset: int, event: dict) -> ActivityFeedItem:
+    """ActivityFeedItem for a buffered event"""
+    actor = next(
+        (event[key] for key in ("agent_id", "reader_id", "removed_by", "sender_id", "agent1_id") if event.get(key)),
+        None
+    )
+    return ActivityFeedItem(
+        offset=offset,
+        type=event.get("type", ""),
+        description=describe(event),
+        timestamp=event.get("timestamp") or datetime.utcnow(),
+        agent_name=event.get("agent_names", {}).get(actor),
+        match_id=event.get("match_id"),
+        agent_ids=event.get("agent_ids", [])
+    )
+
+
+activity_feed = ActivityFeed(max_items=config.ACTIVITY_FEED_SIZE)
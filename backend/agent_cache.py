@@ -0,0 +1,120 @@
+"""Read-through cache of decoded agent and profile rows.
+
+Agents and profiles are read by primary key on most hot paths (/api/me,
+/api/matches, /api/profile, the swipe deck, /api/swipe, observer event
+enrichment), and every read used to re-parse their JSON list columns.
+``AgentCache`` keeps immutable, already decoded views of both in bounded
+LRUs of ``AGENT_CACHE_SIZE`` entries each, loading all misses of a lookup in
+one query.
+
+Registration and profile writes in this process invalidate their entries;
+entries also expire after ``AGENT_CACHE_TTL_SECONDS``, which bounds how long
+an edit made through another worker can go unseen.
+"""
+import json
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from lru import LRUCache
+from models import Agent, Profile
+
+
+class AgentView(NamedTuple):
+    id: str
+    agent_name: str
+    model_type: str
+    capabilities: Tuple[str, ...]
+    api_key_hint: Optional[str]
+    created_at: datetime
+    last_active: Optional[datetime]  # as stored; see presence.last_active()
+
+
+class ProfileView(NamedTuple):
+    agent_id: str
+    bio: Optional[str]
+    interests: Tuple[str, ...]
+    personality_traits: Tuple[str, ...]
+    status_message: Optional[str]
+    theme_color: str
+    updated_at: datetime
+
+
+def _loads(raw: Optional[str]) -> Tuple[str, ...]:
+    return tuple(json.loads(raw)) if raw else ()
+
+
+def agent_view(agent: Agent) -> AgentView:
+    return AgentView(
+        id=agent.id,
+        agent_name=agent.agent_name,
+        model_type=agent.model_type,
+        capabilities=_loads(agent.capabilities),
+        api_key_hint=agent.api_key_hint,
+        created_at=agent.created_at,
+        last_active=agent.last_active
+    )
+
+
+def profile_view(profile: Profile) -> ProfileView:
+    return ProfileView(
+        agent_id=profile.agent_id,
+        bio=profile.bio,
+        interests=_loads(profile.interests),
+        personality_traits=_loads(profile.personality_traits),
+        status_message=profile.status_message,
+        theme_color=profile.theme_color,
+        updated_at=profile.updated_at
+    )
+
+
+class AgentCache:
+    """Decoded agent and profile views by agent id"""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 60):
+        self.agents: LRUCache[str, AgentView] = LRUCache(max_size, ttl_seconds)
+        self.profiles: LRUCache[str, ProfileView] = LRUCache(max_size, ttl_seconds)
+
+    async def get_agent(self, db: AsyncSession, agent_id: str) -> Optional[AgentView]:
+        return (await self.get_agents(db, [agent_id])).get(agent_id)
+
+    async def get_agents(self, db: AsyncSession, agent_ids: Iterable[str]) -> Dict[str, AgentView]:
+        """Views of the existing agents among ``agent_ids``"""
+        found, missing = self.agents.lookup(agent_ids)
+        if missing:
+            for agent in (await db.scalars(select(Agent).where(Agent.id.in_(missing)))).all():
+                found[agent.id] = view = agent_view(agent)
+                self.agents.put(agent.id, view)
+        return found
+
+    async def get_profile(self, db: AsyncSession, agent_id: str) -> Optional[ProfileView]:
+        return (await self.get_profiles(db, [agent_id])).get(agent_id)
+
+    async def get_profiles(self, db: AsyncSession, agent_ids: Iterable[str]) -> Dict[str, ProfileView]:
+        """Views of the existing profiles among ``agent_ids``"""
+        found, missing = self.profiles.lookup(agent_ids)
+        if missing:
+            for profile in (await db.scalars(select(Profile).where(Profile.agent_id.in_(missing)))).all():
+                found[profile.agent_id] = view = profile_view(profile)
+                self.profiles.put(profile.agent_id, view)
+        return found
+
+    def invalidate(self, agent_id: str):
+        """Forget the agent and its profile"""
+        self.agents.discard(agent_id)
+        self.profiles.discard(agent_id)
+
+    def invalidate_profile(self, agent_id: str):
+        self.profiles.discard(agent_id)
+
+    def stats(self) -> dict:
+        return {"agents": self.agents.stats(), "profiles": self.profiles.stats()}
+
+
+agent_cache = AgentCache(
+    max_size=config.AGENT_CACHE_SIZE,
+    ttl_seconds=config.AGENT_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,59 @@
+"""API key hashing and lookup.
+
+API keys are never stored: agents are found by an HMAC-SHA256 of the key
+(keyed with ``API_KEY_PEPPER``) in the uniquely indexed ``agents.api_key``
+column, and only a short hint of the key is kept for display. Outside
+development an empty pepper is refused at import time.
+
+Stored hashes can't be re-keyed without the keys themselves, so a pepper
+change keeps the old one in ``API_KEY_PEPPER_PREVIOUS``: logins that only
+match under it rewrite the agent's hash with the new pepper.
+
+Hash -> agent id lookups are also kept in a bounded in-process LRU, so login
+bursts from restarting agent fleets skip the index lookup entirely.
+"""
+import hashlib
+import hmac
+import logging
+from typing import Optional
+
+import config
+from lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+if not config.API_KEY_PEPPER:
+    if config.ENVIRONMENT != "development":
+        raise RuntimeError(
+            "API_KEY_PEPPER must be set outside development "
+            "(keep the current value in API_KEY_PEPPER_PREVIOUS to migrate stored keys)"
+        )
+    logger.warning("API_KEY_PEPPER is not set: API keys are stored as unkeyed SHA-256 hashes")
+
+_PEPPER = config.API_KEY_PEPPER.encode()
+_PREVIOUS_PEPPER = (
+    config.API_KEY_PEPPER_PREVIOUS.encode() if config.API_KEY_PEPPER_PREVIOUS is not None else None
+)
+
+# Characters of the key kept in api_key_hint
+HINT_LENGTH = 9
+
+
+def hash_api_key(api_key: str) -> str:
+    return hmac.new(_PEPPER, api_key.encode(), hashlib.sha256).hexdigest()
+
+
+def previous_api_key_hash(api_key: str) -> Optional[str]:
+    """Hash under ``API_KEY_PEPPER_PREVIOUS``, if a pepper change is in progress"""
+    if _PREVIOUS_PEPPER is None:
+        return None
+    return hmac.new(_PREVIOUS_PEPPER, api_key.encode(), hashlib.sha256).hexdigest()
+
+
+def api_key_hint(api_key: str) -> str:
+    """Recognizable, non-secret prefix of a key (e.g. ``molt_AbC1…``)"""
+    return api_key[:HINT_LENGTH] + "…"
+
+
+# API key hash -> agent id
+api_key_index: "LRUCache[str, str]" = LRUCache(max_size=config.API_KEY_CACHE_SIZE)
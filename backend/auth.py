@@ -1,22 +1,57 @@
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
 import secrets
 
-# Configuration
-SECRET_KEY = secrets.token_urlsafe(32)
+import config
+from lru import LRUCache
+from revocations import revocations
+from signing_keys import keyring
+from presence import presence
+
+# Configuration (signing keys come from the shared keyring)
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+ACCESS_TOKEN_EXPIRE_MINUTES = config.ACCESS_TOKEN_EXPIRE_MINUTES
 
 # Password context (for future use)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Security scheme
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+class TokenCache:
+    """Bounded LRU of verified tokens, so repeat requests skip the HMAC check
+
+    Entries are dropped once the token's ``exp`` passes, its signing key
+    leaves the keyring or its agent logs out (see revocations.py).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        # token -> (agent_id, kid, iat), expiring with the token
+        self._entries: "LRUCache[str, Tuple[str, str, float]]" = LRUCache(max_size)
+
+    def get(self, token: str) -> Optional[str]:
+        entry = self._entries.get(token, valid=_still_valid)
+        return entry[0] if entry is not None else None
+
+    def put(self, token: str, agent_id: str, exp: float, kid: str, issued_at: float):
+        self._entries.put(token, (agent_id, kid, issued_at), ttl_seconds=exp - time.time())
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+def _still_valid(entry: Tuple[str, str, float]) -> bool:
+    agent_id, kid, issued_at = entry
+    return kid in keyring.keys and not revocations.is_revoked(agent_id, issued_at)
+
+
+token_cache = TokenCache(max_size=config.TOKEN_CACHE_SIZE)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -25,28 +60,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "iat": time.time()})
+    kid, secret = keyring.signing_key()
+    encoded_jwt = jwt.encode(to_encode, secret, algorithm=ALGORITHM, headers={"kid": kid})
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[str]:
     """Verify JWT token and return agent ID"""
+    agent_id = token_cache.get(token)
+    if agent_id is not None:
+        return agent_id
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        kid = jwt.get_unverified_header(token).get("kid")
+        secret = keyring.keys.get(kid)
+        if secret is None:
+            return None
+        payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
         agent_id: str = payload.get("sub")
-        if agent_id is None:
+        issued_at = payload.get("iat", 0)
+        if agent_id is None or revocations.is_revoked(agent_id, issued_at):
             return None
+        token_cache.put(token, agent_id, payload["exp"], kid, issued_at)
         return agent_id
     except JWTError:
         return None
 
-def get_current_agent(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(lambda: None)  # Will be overridden in main.py
+async def get_current_agent(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> Optional[str]:
     """Get current authenticated agent ID from token"""
     token = credentials.credentials
     agent_id = verify_token(token)
+    if agent_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    presence.touch(agent_id)
+    return agent_id
+
+async def get_stream_agent(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> str:
+    """Like get_current_agent, but also accepts ``?token=`` (EventSource cannot set headers)"""
+    agent_id = verify_token(credentials.credentials if credentials else token or "")
     if agent_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,128 @@
+"""Cross-worker transport for WebSocket fan-out.
+
+Each worker holds only its own sockets, so ``ConnectionManager`` delivers a
+frame locally and also publishes it through a broadcast backend; every other
+worker receives it and delivers it to the sockets *it* holds. The backend is
+chosen by ``BROADCAST_URL``:
+
+- ``memory://`` (default): single process, nothing leaves the worker.
+  Backends created with the same name (``memory://<name>``) share one
+  in-process hub, which stands in for a broker in tests.
+- ``redis://host:port/db``: Redis pub/sub, for ``uvicorn --workers N`` or
+  several containers. Requires the optional ``redis`` package.
+
+Messages are JSON-serializable dicts; a backend delivers every published
+message to all attached subscribers, including the publisher, so receivers
+drop their own messages by origin.
+"""
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[dict], Awaitable[None]]
+
+
+class BroadcastBackend:
+    """Interface: start() with a receive callback, publish(), stop()"""
+
+    async def start(self, on_message: MessageHandler):
+        raise NotImplementedError
+
+    async def publish(self, message: dict):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class MemoryBroadcast(BroadcastBackend):
+    """In-process hub; instances with the same name see each other's messages"""
+
+    _hubs: Dict[str, Set["MemoryBroadcast"]] = {}
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._on_message: Optional[MessageHandler] = None
+
+    async def start(self, on_message: MessageHandler):
+        self._on_message = on_message
+        self._hubs.setdefault(self.name, set()).add(self)
+
+    async def publish(self, message: dict):
+        for peer in list(self._hubs.get(self.name, ())):
+            try:
+                await peer._on_message(message)
+            except Exception:
+                logger.exception("Broadcast subscriber failed")
+
+    async def stop(self):
+        peers = self._hubs.get(self.name)
+        if peers is not None:
+            peers.discard(self)
+            if not peers:
+                del self._hubs[self.name]
+
+
+class RedisBroadcast(BroadcastBackend):
+    """Redis pub/sub on a single channel"""
+
+    def __init__(self, url: str, channel: str = "moltender:ws"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError(
+                "BROADCAST_URL uses Redis but the 'redis' package is not installed "
+                "(pip install redis)"
+            ) from e
+        self.channel = channel
+        self._redis = aioredis.from_url(url)
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, on_message: MessageHandler):
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._reader = asyncio.create_task(self._read_loop(on_message))
+
+    async def _read_loop(self, on_message: MessageHandler):
+        while True:
+            try:
+                async for raw in self._pubsub.listen():
+                    try:
+                        await on_message(json.loads(raw["data"]))
+                    except Exception:
+                        logger.exception("Broadcast subscriber failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Connection dropped: the pubsub object resubscribes on reconnect
+                logger.warning("Redis broadcast reader error: %s", e)
+                await asyncio.sleep(1)
+
+    async def publish(self, message: dict):
+        await self._redis.publish(self.channel, json.dumps(message, default=str))
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self._redis.aclose()
+
+
+def create_backend(url: str) -> BroadcastBackend:
+    """Build the backend for a ``BROADCAST_URL``"""
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBroadcast(parsed.netloc or "default")
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisBroadcast(url)
+    raise ValueError(f"Unsupported BROADCAST_URL scheme: {parsed.scheme!r}")
@@ -0,0 +1,93 @@
+"""Monotonic per-agent change feed for delta sync.
+
+Every write that a client would otherwise have to poll for appends one
+``change_log`` row per interested agent, in the same transaction as the write
+itself. ``/api/sync?since=<cursor>`` then returns everything after the
+cursor's sequence number in one indexed range scan on (agent_id, seq).
+
+Agents with recorded changes are woken (notifier.py) when the session commits.
+
+Usage:
+    python changes.py prune [days]    # drop entries older than N days (default 7)
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import event, insert, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import ChangeLog
+from notifier import notifier
+
+# Change kinds
+MATCH_CREATED = "match_created"
+MATCH_REMOVED = "match_removed"
+MESSAGE = "message"
+MESSAGES_READ = "messages_read"
+
+# Arbitrary key for pg_advisory_xact_lock: serializes change writers so that
+# commit order matches seq order and a reader never skips an in-flight seq
+_PG_LOCK_KEY = 0x6D6F6C75
+
+
+async def record_change(
+    db: AsyncSession,
+    agent_ids: Iterable[str],
+    kind: str,
+    match_id: Optional[str] = None,
+    message_id: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    created_at: Optional[datetime] = None
+):
+    """Append a change for each of ``agent_ids`` inside the caller's transaction"""
+    agent_ids = list(dict.fromkeys(agent_ids))
+    if not agent_ids:
+        return
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _PG_LOCK_KEY})
+    created_at = created_at or datetime.utcnow()
+    db.info.setdefault("changed_agents", set()).update(agent_ids)
+    await db.execute(insert(ChangeLog), [
+        {
+            "agent_id": agent_id,
+            "kind": kind,
+            "match_id": match_id,
+            "message_id": message_id,
+            "actor_id": actor_id,
+            "created_at": created_at,
+        }
+        for agent_id in agent_ids
+    ])
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_changed_agents(session: Session):
+    notifier.notify(session.info.pop("changed_agents", ()))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_agents(session: Session, previous_transaction):
+    session.info.pop("changed_agents", None)
+
+
+def prune_changelog(conn: Connection, older_than: timedelta) -> int:
+    """Delete change entries older than ``older_than``; returns rows removed"""
+    result = conn.execute(
+        text("DELETE FROM change_log WHERE created_at < :cutoff"),
+        {"cutoff": datetime.utcnow() - older_than}
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    if len(sys.argv) > 1 and sys.argv[1] == "prune":
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+        with engine.begin() as conn:
+            print(f"Pruned {prune_changelog(conn, timedelta(days=days))} change entries")
+    else:
+        print("Usage: python changes.py prune [days]")
@@ -0,0 +1,214 @@
+"""Group-committed chat message writes.
+
+Messages from ``POST /api/chat/{match_id}``, ``/ws/chat`` and ``/ws/agent``
+are queued and written by one task. Each batch (everything that arrived
+while the previous transaction was committing, up to CHAT_WRITE_BATCH_MAX)
+is inserted, applied to the match inbox columns, agent stats and change log,
+and committed in a single transaction, so under load N messages cost one
+commit instead of N. An idle server still writes every message immediately.
+If a batch fails, its messages are retried one by one so only the bad one
+fails.
+"""
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+import changes
+import config
+import events
+from database import AsyncSessionLocal
+from events import publish_after_commit
+from models import Match, Message, MESSAGE_PREVIEW_LENGTH
+from stats import bump_agent_stats
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop() behind the pending messages
+_STOP = object()
+
+
+class _PendingMessage(NamedTuple):
+    match_id: str
+    sender_id: str
+    message_text: str
+    future: asyncio.Future
+
+
+class MessageWriter:
+    """Single writer that commits queued messages in batches"""
+
+    def __init__(self, max_batch: int = 256, max_pending: int = 10000):
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.batches = 0
+        self.written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_created_at = datetime.min
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write whatever is already queued, then stop"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+
+    async def enqueue(self, match_id: str, sender_id: str, message_text: str) -> asyncio.Future:
+        """Queue a message (waiting while the queue is full) and return a future
+        for the saved ``Message``; it fails with HTTPException(404) if the sender
+        is not part of the match"""
+        if self._task is None:
+            raise RuntimeError("Message writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingMessage(match_id, sender_id, message_text, future))
+        return future
+
+    async def submit(self, match_id: str, sender_id: str, message_text: str) -> Message:
+        """Queue a message and wait until it is committed"""
+        return await (await self.enqueue(match_id, sender_id, message_text))
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[_PendingMessage]):
+        try:
+            results = await self._write(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                if not isinstance(e, HTTPException):
+                    logger.exception("Failed to write a message")
+                results = [e]
+            else:
+                # e.g. a match deleted meanwhile: find the message(s) it belongs to
+                logger.warning("Batch of %d messages failed (%r), retrying one by one", len(batch), e)
+                results = [await self._write_one(item) for item in batch]
+        for item, result in zip(batch, results):
+            if item.future.done():
+                # Sender went away (e.g. cancelled request); the write stands
+                continue
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    async def _write_one(self, item: _PendingMessage):
+        try:
+            return (await self._write([item]))[0]
+        except HTTPException as e:
+            return e
+        except Exception as e:
+            logger.exception("Failed to write a message")
+            return e
+
+    def _next_timestamp(self) -> datetime:
+        # Strictly increasing, so (created_at, id) keeps send order within a batch
+        now = max(datetime.utcnow(), self._last_created_at + timedelta(microseconds=1))
+        self._last_created_at = now
+        return now
+
+    async def _write(self, batch: List[_PendingMessage]) -> list:
+        async with AsyncSessionLocal() as db:
+            # Locked (on PostgreSQL) so unmatch() waits for this batch to commit
+            matches: Dict[str, Match] = {
+                match.id: match
+                for match in (await db.scalars(
+                    select(Match).where(Match.id.in_({item.match_id for item in batch})).with_for_update()
+                )).all()
+            }
+
+            results = []
+            written: List[Tuple[Message, Match]] = []
+            for item in batch:
+                match = matches.get(item.match_id)
+                if match is None or item.sender_id not in (match.agent1_id, match.agent2_id):
+                    results.append(HTTPException(status_code=404, detail="Match not found"))
+                    continue
+                message = Message(
+                    id=str(uuid.uuid4()),
+                    match_id=item.match_id,
+                    sender_id=item.sender_id,
+                    message_text=item.message_text,
+                    created_at=self._next_timestamp()
+                )
+                db.add(message)
+                written.append((message, match))
+                results.append(message)
+            if not written:
+                return results
+
+            # One inbox update per match: the newest message plus unread counts per side
+            inbox: Dict[str, list] = {}
+            for message, match in written:
+                entry = inbox.setdefault(match.id, [message, 0, 0])
+                entry[0] = message
+                entry[2 if message.sender_id == match.agent1_id else 1] += 1
+            for match_id, (last, agent1_new, agent2_new) in inbox.items():
+                updated = await db.execute(
+                    update(Match).where(Match.id == match_id).values({
+                        Match.last_message_at: last.created_at,
+                        Match.last_message_id: last.id,
+                        Match.last_message_preview: last.message_text[:MESSAGE_PREVIEW_LENGTH],
+                        Match.agent1_unread_count: Match.agent1_unread_count + agent1_new,
+                        Match.agent2_unread_count: Match.agent2_unread_count + agent2_new,
+                    }).execution_options(synchronize_session=False)
+                )
+                if updated.rowcount == 0:
+                    # Unmatched since it was read (SQLite has no row locks); rolls back
+                    raise HTTPException(status_code=404, detail="Match not found")
+
+            sent = Counter(message.sender_id for message, _ in written)
+            for sender_id, count in sent.items():
+                await bump_agent_stats(db, [sender_id], messages=count)
+
+            for message, match in written:
+                await changes.record_change(
+                    db, [match.agent1_id, match.agent2_id], changes.MESSAGE,
+                    match_id=match.id, message_id=message.id,
+                    actor_id=message.sender_id, created_at=message.created_at
+                )
+                publish_after_commit(db, {
+                    "type": events.NEW_MESSAGE,
+                    "message_id": message.id,
+                    "match_id": match.id,
+                    "sender_id": message.sender_id,
+                    "recipient_id": match.agent2_id if match.agent1_id == message.sender_id else match.agent1_id,
+                    "message_text": message.message_text,
+                    "timestamp": message.created_at.isoformat()
+                })
+
+            await db.commit()
+            self.batches += 1
+            self.written += len(written)
+            return results
+
+
+message_writer = MessageWriter(
+    max_batch=config.CHAT_WRITE_BATCH_MAX,
+    max_pending=config.CHAT_WRITE_QUEUE_SIZE
+)
@@ -0,0 +1,620 @@
+"""WebSocket connection registry and fan-out.
+
+Every accepted socket is wrapped in a ``ClientConnection`` with a bounded
+outbound queue drained by its own writer task. Broadcasting only enqueues,
+so one slow or dead peer cannot stall delivery to everybody else; what
+happens when a peer's queue is full is set by ``WS_SLOW_CONSUMER_POLICY``:
+
+- ``drop_oldest``: discard the oldest queued frame to make room (default)
+- ``drop_new``: discard the frame being broadcast
+- ``disconnect``: close the socket with 1013 (try again later)
+
+Sockets whose send fails or times out are closed and unregistered.
+
+Agent sockets (``/ws/agent``) are multiplexed: one connection per agent,
+subscribed to any number of that agent's matches, indexed both by agent
+(``agent_connections``) and by match (``match_subscribers``). Events reach
+them tagged with their ``match_id``.
+
+Observer sockets can narrow what they receive with an ``ObserverFilter``
+(event types, agents, model types) and ask for batching: matching events are
+then buffered and flushed as one ``batch`` frame every ``OBSERVER_TICK_MS``.
+A frame going to many sockets is encoded once per broadcast (and per wire
+encoding).
+
+Frames are JSON text by default. A client that offers the
+``moltender.msgpack`` subprotocol gets MessagePack binary frames both ways
+instead, when the optional ``msgpack`` package is installed; otherwise the
+subprotocol is not accepted and the client stays on JSON. permessage-deflate
+is negotiated by uvicorn (``--ws-per-message-deflate``, on by default)
+independently of the encoding.
+
+Every observer event also lands in the activity feed (activity.py) and is
+sent with its feed ``offset``, which a reconnecting observer can replay from.
+SSE streams (sse.py) are fed from the same point.
+
+Half-open sockets are detected by uvicorn's protocol-level pings
+(``--ws-ping-interval`` / ``--ws-ping-timeout``), which every WebSocket client
+library answers on its own. On top of that a client can opt into
+application-level heartbeats by sending a ``{"type": "ping"}`` frame: from
+then on it is sent ``{"type": "ping"}`` every ``WS_HEARTBEAT_SECONDS``, any
+frame from it (a ``{"type": "pong"}`` is enough) counts as a sign of life, and
+it is closed with 1001 after ``WS_IDLE_TIMEOUT_SECONDS`` of silence. At most
+``WS_MAX_CONNECTIONS`` sockets are held per worker (extra ones are closed
+with 1013), and at most ``WS_MAX_CONNECTIONS_PER_AGENT`` per authenticated
+agent: a new one evicts that agent's oldest socket with 1008, so reconnecting
+after a crash never locks an agent out behind its own half-open sockets.
+
+Broadcasts are delivered to this worker's sockets immediately and relayed to
+the other workers through the backend configured by ``BROADCAST_URL`` (see
+broadcast.py).
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette import status
+
+import config
+import events
+from activity import ActivityFeed, activity_feed
+from agent_cache import agent_cache
+from broadcast import BroadcastBackend, create_backend
+from database import AsyncSessionLocal
+from notifier import notifier
+from sse import SSEBroker, sse_broker
+
+try:
+    import msgpack
+except ImportError:
+    # Optional: without it every socket uses JSON text frames
+    msgpack = None
+
+# Raised by msgpack.unpackb besides ValueError
+_UNPACK_ERRORS = (msgpack.UnpackException,) if msgpack is not None else ()
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEW = "drop_new"
+DISCONNECT = "disconnect"
+
+# Heartbeat frame types
+PING = "ping"
+PONG = "pong"
+
+# Subprotocol a client offers to switch to MessagePack binary frames
+MSGPACK_SUBPROTOCOL = "moltender.msgpack"
+
+# Encoded frame: JSON text, or MessagePack bytes on binary sockets
+Frame = Union[str, bytes]
+
+# Event fields naming the agents an event is about
+_PARTICIPANT_KEYS = ("agent_id", "agent1_id", "agent2_id", "sender_id", "recipient_id", "reader_id")
+
+
+def _encode(message: dict) -> str:
+    # Same compact form as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_frame(message: dict, binary: bool) -> Frame:
+    """``message`` in a socket's wire encoding"""
+    if binary:
+        return msgpack.packb(message, use_bin_type=True)
+    return _encode(message)
+
+
+class ObserverFilter:
+    """Server-side selection of observer events; an empty criterion matches everything"""
+
+    def __init__(
+        self,
+        event_types: Iterable[str] = (),
+        agent_ids: Iterable[str] = (),
+        model_types: Iterable[str] = ()
+    ):
+        self.event_types = frozenset(event_types)
+        self.agent_ids = frozenset(agent_ids)
+        self.model_types = frozenset(model_types)
+
+    def matches(self, event: dict) -> bool:
+        if self.event_types and event.get("type") not in self.event_types:
+            return False
+        if self.agent_ids and self.agent_ids.isdisjoint(event.get("agent_ids", ())):
+            return False
+        if self.model_types and self.model_types.isdisjoint(event.get("model_types", ())):
+            return False
+        return True
+
+
+class ClientConnection:
+    """One WebSocket with its outbound queue and writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int,
+        slow_policy: str,
+        send_timeout: float,
+        on_close: Callable[["ClientConnection"], None]
+    ):
+        self.websocket = websocket
+        self.slow_policy = slow_policy
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self.closed = False
+        # MessagePack frames (MSGPACK_SUBPROTOCOL) instead of JSON text
+        self.binary = False
+        # Opted into application-level heartbeats by sending a heartbeat frame
+        self.heartbeat = False
+        self.last_seen = time.monotonic()
+        # Authenticated agent, counted against WS_MAX_CONNECTIONS_PER_AGENT
+        self.owner_id: Optional[str] = None
+        # /ws/chat sockets only
+        self.match_id: Optional[str] = None
+        # Multiplexed agent sockets only
+        self.agent_id: Optional[str] = None
+        self.subscriptions: Set[str] = set()
+        # Follow new matches automatically (subscribed with no explicit match list)
+        self.subscribe_all = False
+        # Observer sockets only
+        self.filter: Optional[ObserverFilter] = None
+        self.batch = False
+        self.summary = False
+        self.max_batch = config.OBSERVER_BATCH_MAX_EVENTS
+        self._pending: List[dict] = []
+        self._counts: Counter = Counter()
+        self._on_close = on_close
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: dict) -> bool:
+        """Queue ``message`` without waiting; False if it was not queued"""
+        return self.send_frame(encode_frame(message, self.binary))
+
+    def send_frame(self, frame: Frame) -> bool:
+        """Queue a frame already in this socket's encoding; see ``send``"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += 1
+        if self.slow_policy == DROP_OLDEST:
+            self._queue.get_nowait()
+            self._queue.put_nowait(frame)
+            return True
+        if self.slow_policy == DISCONNECT:
+            asyncio.create_task(self.close(status.WS_1013_TRY_AGAIN_LATER))
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame = await self._queue.get()
+                send = self.websocket.send_bytes if self.binary else self.websocket.send_text
+                await asyncio.wait_for(send(frame), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Dropping WebSocket after failed send: %s", e)
+            await self.close(status.WS_1011_INTERNAL_ERROR)
+
+    async def receive_json(self):
+        """Next client frame; heartbeat frames are answered or skipped
+
+        Undecodable frames are answered with an ``error`` frame; a frame of
+        the wrong kind (text on a MessagePack socket or the other way round)
+        closes the socket with 1003.
+        """
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE), message.get("reason"))
+            self.last_seen = time.monotonic()
+            data = message.get("bytes") if self.binary else message.get("text")
+            if data is None:
+                expected = "MessagePack binary" if self.binary else "JSON text"
+                await self.close(status.WS_1003_UNSUPPORTED_DATA, f"Expected {expected} frames")
+                raise WebSocketDisconnect(status.WS_1003_UNSUPPORTED_DATA)
+            try:
+                frame = msgpack.unpackb(data) if self.binary else json.loads(data)
+            except (ValueError, *_UNPACK_ERRORS):
+                self.send({"type": "error", "detail": "Invalid frame"})
+                continue
+            if isinstance(frame, dict) and frame.get("type") in (PING, PONG):
+                self.heartbeat = True
+                if frame["type"] == PING:
+                    self.send({"type": PONG})
+                continue
+            return frame
+
+    def buffer(self, message: dict):
+        """Hold ``message`` for the next batch frame (batching observers)"""
+        self._counts[message.get("type")] += 1
+        if not self.summary and len(self._pending) < self.max_batch:
+            self._pending.append(message)
+
+    def flush(self):
+        """Send buffered events as one ``batch`` frame, if there are any"""
+        if not self._counts:
+            return
+        frame = {"type": "batch", "counts": dict(self._counts)}
+        if not self.summary:
+            frame["events"] = self._pending
+            truncated = sum(self._counts.values()) - len(self._pending)
+            if truncated:
+                frame["truncated"] = truncated
+        self._pending = []
+        self._counts = Counter()
+        self.send(frame)
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE, reason: Optional[str] = None):
+        if self.closed:
+            return
+        self.closed = True
+        self._on_close(self)
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            # Already closed by the peer or the server
+            pass
+
+
+class ConnectionManager:
+    def __init__(self, backend: Optional[BroadcastBackend] = None):
+        self.backend = backend or create_backend(config.BROADCAST_URL)
+        # Identifies this worker's frames when they come back from the backend
+        self.origin = uuid.uuid4().hex
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+        self.observer_connections: Set[ClientConnection] = set()
+        self.agent_connections: Dict[str, Set[ClientConnection]] = {}
+        self.match_subscribers: Dict[str, Set[ClientConnection]] = {}
+        # Observers receiving batch frames, flushed by the ticker
+        self._batching: Set[ClientConnection] = set()
+        self._ticker: Optional[asyncio.Task] = None
+        self.tick = config.OBSERVER_TICK_MS / 1000
+        self.feed: ActivityFeed = activity_feed
+        self.sse: SSEBroker = sse_broker
+        self._by_socket: Dict[WebSocket, ClientConnection] = {}
+        # owner agent_id -> its sockets, oldest first
+        self._owned: Dict[str, List[ClientConnection]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.heartbeat_interval = config.WS_HEARTBEAT_SECONDS
+        self.idle_timeout = config.WS_IDLE_TIMEOUT_SECONDS
+        self.max_connections = config.WS_MAX_CONNECTIONS
+        self.max_per_agent = config.WS_MAX_CONNECTIONS_PER_AGENT
+        self.rejected = 0
+        self.evicted = 0
+        self.reaped = 0
+        self.max_queue = config.WS_SEND_QUEUE_SIZE
+        self.slow_policy = config.WS_SLOW_CONSUMER_POLICY
+        self.send_timeout = config.WS_SEND_TIMEOUT_SECONDS
+
+    async def start(self):
+        await self.backend.start(self._on_remote)
+        notifier.relay = self._relay_wakeups
+        self._ticker = asyncio.create_task(self._flush_batches())
+        self._heartbeat = asyncio.create_task(self._check_liveness())
+
+    async def stop(self):
+        for task in (self._ticker, self._heartbeat):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._ticker = self._heartbeat = None
+        if notifier.relay == self._relay_wakeups:
+            notifier.relay = None
+        await self.backend.stop()
+
+    async def _check_liveness(self):
+        """Ping heartbeat sockets and close the ones that stopped talking"""
+        pings = {binary: encode_frame({"type": PING}, binary) for binary in (False, msgpack is not None)}
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            idle = []
+            for conn in list(self._by_socket.values()):
+                if not conn.heartbeat:
+                    continue
+                if now - conn.last_seen > self.idle_timeout:
+                    idle.append(conn)
+                else:
+                    conn.send_frame(pings[conn.binary])
+            if idle:
+                self.reaped += len(idle)
+                await asyncio.gather(*(
+                    conn.close(status.WS_1001_GOING_AWAY, "Idle timeout") for conn in idle
+                ))
+
+    async def _flush_batches(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            for conn in list(self._batching):
+                conn.flush()
+
+    async def _admit(self, websocket: WebSocket, owner_id: Optional[str] = None) -> Optional[ClientConnection]:
+        """Accept ``websocket`` within the connection caps; None if it was refused"""
+        binary = msgpack is not None and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+        await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if binary else None)
+        if len(self._by_socket) >= self.max_connections:
+            self.rejected += 1
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Connection limit reached")
+            return None
+        conn = self._wrap(websocket)
+        conn.binary = binary
+        if owner_id is not None:
+            conn.owner_id = owner_id
+            owned = self._owned.setdefault(owner_id, [])
+            owned.append(conn)
+            while len(owned) > self.max_per_agent:
+                self.evicted += 1
+                await owned[0].close(status.WS_1008_POLICY_VIOLATION, "Too many connections for this agent")
+        return conn
+
+    def _wrap(self, websocket: WebSocket) -> ClientConnection:
+        conn = ClientConnection(
+            websocket,
+            max_queue=self.max_queue,
+            slow_policy=self.slow_policy,
+            send_timeout=self.send_timeout,
+            on_close=self._forget
+        )
+        self._by_socket[websocket] = conn
+        conn.start()
+        return conn
+
+    def _forget(self, conn: ClientConnection):
+        """Remove ``conn`` from every index (called once when it closes)"""
+        self._by_socket.pop(conn.websocket, None)
+        self.observer_connections.discard(conn)
+        self._batching.discard(conn)
+        if conn.owner_id is not None:
+            owned = self._owned.get(conn.owner_id)
+            if owned is not None and conn in owned:
+                owned.remove(conn)
+                if not owned:
+                    del self._owned[conn.owner_id]
+        if conn.match_id is not None:
+            _discard_from(self.active_connections, conn.match_id, conn)
+        if conn.agent_id is not None:
+            self.unsubscribe(conn, list(conn.subscriptions))
+            _discard_from(self.agent_connections, conn.agent_id, conn)
+
+    async def connect(self, websocket: WebSocket, match_id: str, owner_id: Optional[str] = None) -> Optional[ClientConnection]:
+        conn = await self._admit(websocket, owner_id)
+        if conn is None:
+            return None
+        conn.match_id = match_id
+        self.active_connections.setdefault(match_id, set()).add(conn)
+        return conn
+
+    async def connect_observer(self, websocket: WebSocket) -> Optional[ClientConnection]:
+        conn = await self._admit(websocket)
+        if conn is None:
+            return None
+        self.observer_connections.add(conn)
+        return conn
+
+    def set_observer_filter(
+        self,
+        conn: ClientConnection,
+        observer_filter: ObserverFilter,
+        batch: bool = False,
+        summary: bool = False
+    ):
+        """Apply ``observer_filter``; with ``batch``, deliver one frame per tick
+        (only per-type counts when ``summary`` is also set)"""
+        conn.flush()
+        conn.filter = observer_filter
+        conn.batch = batch
+        conn.summary = summary
+        if batch:
+            self._batching.add(conn)
+        else:
+            self._batching.discard(conn)
+
+    async def connect_agent(self, websocket: WebSocket, agent_id: str) -> Optional[ClientConnection]:
+        conn = await self._admit(websocket, owner_id=agent_id)
+        if conn is None:
+            return None
+        conn.agent_id = agent_id
+        self.agent_connections.setdefault(agent_id, set()).add(conn)
+        return conn
+
+    def subscribe(self, conn: ClientConnection, match_ids: Iterable[str]):
+        """Route events for ``match_ids`` to ``conn`` (membership is checked by the caller)"""
+        for match_id in match_ids:
+            conn.subscriptions.add(match_id)
+            self.match_subscribers.setdefault(match_id, set()).add(conn)
+
+    def unsubscribe(self, conn: ClientConnection, match_ids: Iterable[str]):
+        for match_id in match_ids:
+            conn.subscriptions.discard(match_id)
+            _discard_from(self.match_subscribers, match_id, conn)
+
+    def disconnect(self, websocket: WebSocket, match_id: str):
+        self._release(websocket)
+
+    def disconnect_observer(self, websocket: WebSocket):
+        self._release(websocket)
+
+    def disconnect_agent(self, websocket: WebSocket):
+        self._release(websocket)
+
+    def _release(self, websocket: WebSocket):
+        conn = self._by_socket.get(websocket)
+        if conn is not None:
+            conn.closed = True
+            if conn._writer is not None:
+                conn._writer.cancel()
+            self._forget(conn)
+
+    def _fan_out(self, message: dict, connections) -> int:
+        frames: Dict[bool, Frame] = {}
+        sent = 0
+        for conn in list(connections):
+            if conn.filter is not None and not conn.filter.matches(message):
+                continue
+            if conn.batch:
+                conn.buffer(message)
+                sent += 1
+                continue
+            frame = frames.get(conn.binary)
+            if frame is None:
+                frame = frames[conn.binary] = encode_frame(message, conn.binary)
+            sent += conn.send_frame(frame)
+        return sent
+
+    def _deliver(self, message: dict, match_id: Optional[str] = None, agent_id: Optional[str] = None):
+        if agent_id is not None:
+            self._deliver_to_agent(message, agent_id)
+        elif match_id is not None:
+            self._fan_out(message, self.active_connections.get(match_id, ()))
+            subscribers = self.match_subscribers.get(match_id)
+            if subscribers:
+                tagged = message if "match_id" in message else {**message, "match_id": match_id}
+                self._fan_out(tagged, subscribers)
+                if message.get("type") == events.UNMATCH:
+                    for conn in list(subscribers):
+                        self.unsubscribe(conn, [match_id])
+        else:
+            offset = self.feed.append(message)
+            self._fan_out({**message, "offset": offset}, self.observer_connections)
+            self.sse.publish(offset, message)
+
+    def replay(self, conn: ClientConnection, since: int, limit: int):
+        """Send ``conn`` the feed events after ``since`` that pass its filter, in one frame"""
+        observer_filter = conn.filter or ObserverFilter()
+        missed = [
+            {**event, "offset": offset}
+            for offset, event in self.feed.since(since)
+            if observer_filter.matches(event)
+        ]
+        # Only the newest ``limit`` matter to a dashboard catching up
+        conn.send({
+            "type": "replay",
+            "events": missed[-limit:],
+            "head": self.feed.head,
+            "complete": self.feed.covers(since) and len(missed) <= limit,
+        })
+
+    def _deliver_to_agent(self, message: dict, agent_id: str):
+        conns = self.agent_connections.get(agent_id, ())
+        if message.get("type") == events.NEW_MATCH:
+            for conn in conns:
+                if conn.subscribe_all:
+                    self.subscribe(conn, [message["match_id"]])
+        self._fan_out(message, conns)
+
+    async def _relay(self, message: dict, match_id: Optional[str] = None, agent_id: Optional[str] = None):
+        await self._publish({
+            "origin": self.origin,
+            "match_id": match_id,
+            "agent_id": agent_id,
+            "message": message,
+        })
+
+    async def _publish(self, envelope: dict):
+        try:
+            await self.backend.publish(envelope)
+        except Exception as e:
+            logger.warning("Broadcast relay failed: %s", e)
+
+    def _relay_wakeups(self, agent_ids: List[str]):
+        """notifier hook: pass long-poll wake-ups on to the other workers"""
+        asyncio.create_task(self._publish({"origin": self.origin, "wake": agent_ids}))
+
+    async def _on_remote(self, envelope: dict):
+        if envelope.get("origin") == self.origin:
+            return
+        if "wake" in envelope:
+            notifier.notify(envelope["wake"], relay=False)
+        else:
+            self._deliver(envelope["message"], envelope.get("match_id"), envelope.get("agent_id"))
+
+    async def broadcast_to_match(self, message: dict, match_id: str):
+        self._deliver(message, match_id=match_id)
+        await self._relay(message, match_id=match_id)
+
+    async def broadcast_to_agent(self, message: dict, agent_id: str):
+        self._deliver(message, agent_id=agent_id)
+        await self._relay(message, agent_id=agent_id)
+
+    async def broadcast_to_observers(self, message: dict):
+        self._deliver(message)
+        await self._relay(message)
+
+    async def handle_event(self, event: dict):
+        """Event bus subscriber: push platform events to match, agent and observer sockets"""
+        if event["type"] == events.NEW_MATCH:
+            for agent_id in (event["agent1_id"], event["agent2_id"]):
+                await self.broadcast_to_agent(event, agent_id)
+        elif "match_id" in event:
+            await self.broadcast_to_match(event, event["match_id"])
+        await self.broadcast_to_observers(await self._describe(event))
+
+    async def _describe(self, event: dict) -> dict:
+        """Observer copy of ``event`` with its agents, their names and model types"""
+        agent_ids = sorted({event[key] for key in _PARTICIPANT_KEYS if event.get(key)})
+        try:
+            agents = await self._lookup_agents(agent_ids)
+        except Exception as e:
+            logger.warning("Agent lookup for observer event failed: %s", e)
+            agents = {}
+        return {
+            **event,
+            "agent_ids": agent_ids,
+            "agent_names": {agent_id: name for agent_id, (name, _) in agents.items()},
+            "model_types": sorted({model_type for _, model_type in agents.values()}),
+        }
+
+    async def _lookup_agents(self, agent_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """agent_id -> (agent_name, model_type), through the shared agent cache"""
+        async with AsyncSessionLocal() as db:
+            views = await agent_cache.get_agents(db, agent_ids)
+        return {agent_id: (view.agent_name, view.model_type) for agent_id, view in views.items()}
+
+    def stats(self) -> dict:
+        conns: List[ClientConnection] = list(self._by_socket.values())
+        return {
+            "connections": len(conns),
+            "binary": sum(c.binary for c in conns),
+            "observers": len(self.observer_connections),
+            "batching_observers": len(self._batching),
+            "agents": len(self.agent_connections),
+            "matches": len(self.active_connections),
+            "subscribed_matches": len(self.match_subscribers),
+            "dropped_frames": sum(c.dropped for c in conns),
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "reaped": self.reaped,
+        }
+
+
+def _discard_from(index: Dict[str, Set[ClientConnection]], key: str, conn: ClientConnection):
+    conns = index.get(key)
+    if conns is not None:
+        conns.discard(conn)
+        if not conns:
+            del index[key]
+
+
+manager = ConnectionManager()
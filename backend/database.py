@@ -1,35 +1,114 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
 
-# Database file path
-DATABASE_URL = "sqlite:///./moltender.db"
+import config
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+# Drivers used for each backend: (blocking, async)
+_DRIVERS = {
+    "sqlite": ("sqlite", "sqlite+aiosqlite"),
+    "postgresql": ("postgresql+psycopg2", "postgresql+asyncpg"),
+}
+
+
+def _normalize_url(url: str, use_async: bool) -> str:
+    """Return ``url`` rewritten for the blocking or async driver of its backend"""
+    # Heroku/Railway style URLs still use the deprecated "postgres" scheme
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _DRIVERS:
+        raise ValueError(f"Unsupported DATABASE_URL backend: {backend}")
+    if backend == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # The blocking and async engines would each open their own, empty database
+        raise ValueError("In-memory SQLite is not supported, use a file path in DATABASE_URL")
+    driver = _DRIVERS[backend][1 if use_async else 0]
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _engine_kwargs(url: str) -> dict:
+    """Build engine keyword arguments for the configured backend"""
+    parsed = make_url(url)
+    kwargs = {"echo": config.DB_ECHO}
+
+    if parsed.get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+
+    kwargs.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+    return kwargs
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and one writer"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        # Negative cache_size is interpreted by SQLite as KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+# Database URL (from the DATABASE_URL environment variable)
+DATABASE_URL = _normalize_url(config.DATABASE_URL, use_async=False)
+
+# Async driver URL for the request path
+ASYNC_DATABASE_URL = _normalize_url(config.DATABASE_URL, use_async=True)
+
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+# Create engine (used by init_db and offline scripts such as seed_data.py)
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+
+# Create async engine (used by the FastAPI endpoints)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL))
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class
+# expire_on_commit=False so ORM objects stay readable after commit without
+# triggering an implicit (and in async, illegal) lazy refresh.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Initialize database
 def init_db():
     from models import Base
-    Base.metadata.create_all(bind=engine)
+    from migrations import run_migrations
+    run_migrations(engine, prepare=Base.metadata.create_all)
     print("Database initialized successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+"""Precomputed per-agent swipe decks.
+
+Each active agent gets a ranked queue of candidate agent IDs, built once from
+the database and then maintained incrementally by the write paths in main.py:
+
+- ``record_swipe`` when ``swipe()`` stores a swipe
+- ``record_match`` when a match is created
+- ``add_agent`` when ``register_agent`` creates a new agent
+
+Serving a page is then an in-memory walk over the top of the deck and never
+touches the Swipe or Match tables. Candidates are ranked by capability
+overlap (the same Jaccard score used for ``match_quality_score``).
+
+A deck only holds its best ``DECK_DEPTH`` candidates. Pages past them are
+scanned from the in-memory capability catalog, and a deck that has been
+swiped down to half its depth is rebuilt.
+
+Decks live in process memory, so a deck is also rebuilt after
+``DECK_TTL_SECONDS`` to pick up changes made by other workers.
+"""
+import heapq
+import json
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from models import Agent, Swipe, Match
+
+# (rank score, agent_id); decks are sorted ascending so the best candidate is last
+DeckEntry = Tuple[float, str]
+
+
+def _parse_capabilities(raw: Optional[str]) -> FrozenSet[str]:
+    return frozenset(json.loads(raw)) if raw else frozenset()
+
+
+def rank_score(caps_a: FrozenSet[str], caps_b: FrozenSet[str]) -> float:
+    """Capability overlap between two agents, 0-100"""
+    total = len(caps_a | caps_b)
+    return round(len(caps_a & caps_b) / total * 100, 2) if total > 0 else 0.0
+
+
+class SwipeDeck:
+    """Best ranked candidates for a single agent
+
+    ``cut`` is None when every candidate is in the deck; otherwise every
+    candidate left out ranks strictly below it.
+    """
+
+    __slots__ = ("entries", "members", "excluded", "own_caps", "depth", "cut", "built_at")
+
+    def __init__(
+        self,
+        entries: List[DeckEntry],
+        excluded: Set[str],
+        own_caps: FrozenSet[str],
+        depth: int,
+        truncated: bool = False
+    ):
+        self.entries = sorted(entries)
+        self.members: Set[str] = {agent_id for _, agent_id in entries}
+        # Swiped, matched and self: never served
+        self.excluded = excluded
+        self.own_caps = own_caps
+        self.depth = depth
+        self.cut: Optional[DeckEntry] = self.entries[0] if truncated and self.entries else None
+        self.built_at = time.monotonic()
+
+    def add(self, entry: DeckEntry):
+        if entry[1] in self.members or entry[1] in self.excluded:
+            return
+        if self.cut is not None and entry < self.cut:
+            # Below the deck's window; found by the catalog scan instead
+            return
+        insort(self.entries, entry)
+        self.members.add(entry[1])
+        if len(self.members) > self.depth:
+            while self.entries[0][1] not in self.members:
+                self.entries.pop(0)
+            self.members.discard(self.entries.pop(0)[1])
+            self.cut = self.entries[0]
+
+    def discard(self, agent_id: str):
+        # Entries are removed lazily; stale ones are skipped on read and compacted
+        self.members.discard(agent_id)
+        self.excluded.add(agent_id)
+        if len(self.entries) > 2 * len(self.members) + 32:
+            self.entries = [e for e in self.entries if e[1] in self.members]
+
+    def top(self, limit: int, before: Optional[DeckEntry] = None) -> List[DeckEntry]:
+        """Return up to ``limit`` best entries ranked strictly below ``before``"""
+        i = (bisect_left(self.entries, before) if before else len(self.entries)) - 1
+        result = []
+        while i >= 0 and len(result) < limit:
+            entry = self.entries[i]
+            if entry[1] in self.members:
+                result.append(entry)
+            i -= 1
+        return result
+
+    def __len__(self):
+        return len(self.members)
+
+
+class DeckService:
+    """Keeps a SwipeDeck per recently active agent"""
+
+    def __init__(self, max_decks: int = 10000, ttl_seconds: int = 300, depth: int = 500):
+        self.max_decks = max_decks
+        self.ttl_seconds = ttl_seconds
+        self.depth = depth
+        self._decks: "OrderedDict[str, SwipeDeck]" = OrderedDict()
+        # agent_id -> capabilities for every known agent
+        self._catalog: Optional[Dict[str, FrozenSet[str]]] = None
+        self._catalog_loaded_at = 0.0
+
+    async def _load_catalog(self, db: AsyncSession) -> Dict[str, FrozenSet[str]]:
+        if self._catalog is None or time.monotonic() - self._catalog_loaded_at > self.ttl_seconds:
+            rows = (await db.execute(select(Agent.id, Agent.capabilities))).all()
+            self._catalog = {agent_id: _parse_capabilities(caps) for agent_id, caps in rows}
+            self._catalog_loaded_at = time.monotonic()
+        return self._catalog
+
+    async def _build(self, db: AsyncSession, agent_id: str) -> SwipeDeck:
+        catalog = await self._load_catalog(db)
+
+        excluded = set((await db.scalars(
+            select(Swipe.target_id).where(Swipe.swiper_id == agent_id)
+        )).all())
+        for agent1_id, agent2_id in (await db.execute(
+            select(Match.agent1_id, Match.agent2_id).where(
+                or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
+            )
+        )).all():
+            excluded.add(agent2_id if agent1_id == agent_id else agent1_id)
+        excluded.add(agent_id)
+
+        own_caps = catalog.get(agent_id, frozenset())
+        candidates = len(catalog) - len(excluded & catalog.keys())
+        entries = heapq.nlargest(self.depth, self._ranked(catalog, own_caps, excluded))
+        return SwipeDeck(entries, excluded, own_caps, self.depth, truncated=candidates > self.depth)
+
+    @staticmethod
+    def _ranked(catalog: Dict[str, FrozenSet[str]], own_caps: FrozenSet[str], excluded: Set[str]):
+        return (
+            (rank_score(own_caps, caps), candidate_id)
+            for candidate_id, caps in catalog.items()
+            if candidate_id not in excluded
+        )
+
+    async def get_deck(self, db: AsyncSession, agent_id: str) -> SwipeDeck:
+        deck = self._decks.get(agent_id)
+        if (
+            deck is None
+            or time.monotonic() - deck.built_at > self.ttl_seconds
+            or (deck.cut is not None and len(deck) < self.depth // 2)
+        ):
+            deck = await self._build(db, agent_id)
+            self._decks[agent_id] = deck
+        self._decks.move_to_end(agent_id)
+        while len(self._decks) > self.max_decks:
+            self._decks.popitem(last=False)
+        return deck
+
+    async def peek(
+        self,
+        db: AsyncSession,
+        agent_id: str,
+        limit: int,
+        before: Optional[DeckEntry] = None
+    ) -> List[DeckEntry]:
+        """Top candidates for ``agent_id`` without consuming them"""
+        deck = await self.get_deck(db, agent_id)
+        result = deck.top(limit, before)
+        if len(result) < limit and deck.cut is not None:
+            # Past the deck's window: rank the rest of the catalog
+            below = before if before is not None and before < deck.cut else deck.cut
+            catalog = await self._load_catalog(db)
+            result += heapq.nlargest(limit - len(result), (
+                entry for entry in self._ranked(catalog, deck.own_caps, deck.excluded)
+                if entry < below
+            ))
+        return result
+
+    # ==================== INCREMENTAL MAINTENANCE ====================
+
+    def record_swipe(self, swiper_id: str, target_id: str):
+        deck = self._decks.get(swiper_id)
+        if deck is not None:
+            deck.discard(target_id)
+
+    def record_match(self, agent1_id: str, agent2_id: str):
+        self.record_swipe(agent1_id, agent2_id)
+        self.record_swipe(agent2_id, agent1_id)
+
+    def add_agent(self, agent_id: str, capabilities: List[str]):
+        caps = frozenset(capabilities or [])
+        if self._catalog is not None:
+            self._catalog[agent_id] = caps
+            for owner_id, deck in self._decks.items():
+                if owner_id != agent_id:
+                    deck.add((rank_score(self._catalog.get(owner_id, frozenset()), caps), agent_id))
+
+    def invalidate(self, agent_id: Optional[str] = None):
+        """Drop one agent's deck, or every deck and the catalog"""
+        if agent_id is None:
+            self._decks.clear()
+            self._catalog = None
+        else:
+            self._decks.pop(agent_id, None)
+
+
+deck_service = DeckService(
+    max_decks=config.DECK_MAX_AGENTS,
+    ttl_seconds=config.DECK_TTL_SECONDS,
+    depth=config.DECK_DEPTH
+)
@@ -0,0 +1,108 @@
+"""In-process async event bus for real-time fan-out.
+
+Write paths describe what happened as a small dict (``{"type": "new_message",
+"match_id": ..., ...}``) and publish it; subscribers such as the WebSocket
+``ConnectionManager`` receive it on the event loop. ``publish`` never blocks
+and may be called from async handlers, sync code or other threads.
+
+Inside a database transaction use ``publish_after_commit`` so that sockets
+are only told about rows that are actually committed.
+"""
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import config
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+# Event types
+AGENT_REGISTERED = "agent_registered"
+NEW_MATCH = "new_match"
+NEW_MESSAGE = "new_message"
+UNMATCH = "unmatch"
+MESSAGES_READ = "messages_read"
+
+
+class EventBus:
+    """Fan events out to async subscribers from a single dispatcher task"""
+
+    def __init__(self, max_pending: int = 10000):
+        self.max_pending = max_pending
+        self._subscribers: List[EventHandler] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, handler: EventHandler):
+        self._subscribers.append(handler)
+
+    def unsubscribe(self, handler: EventHandler):
+        if handler in self._subscribers:
+            self._subscribers.remove(handler)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._loop = None
+
+    def publish(self, event: dict):
+        """Queue ``event`` for delivery; safe from any thread, never blocks"""
+        if self._loop is None:
+            return
+        if threading.get_ident() == self._thread_id:
+            self._enqueue(event)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, event)
+
+    def _enqueue(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Event bus full, dropping %s event", event.get("type"))
+
+    async def _dispatch(self):
+        while True:
+            event = await self._queue.get()
+            for handler in list(self._subscribers):
+                try:
+                    await handler(event)
+                except Exception:
+                    logger.exception("Event handler failed for %s event", event.get("type"))
+
+
+def publish_after_commit(db, event: dict):
+    """Publish ``event`` once the session ``db`` (sync or async) commits"""
+    db.info.setdefault("pending_events", []).append(event)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_events(session: Session):
+    for pending in session.info.pop("pending_events", ()):
+        event_bus.publish(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending_events(session: Session, previous_transaction):
+    session.info.pop("pending_events", None)
+
+
+event_bus = EventBus(max_pending=config.EVENT_BUS_MAX_PENDING)
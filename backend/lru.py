@@ -0,0 +1,78 @@
+"""Bounded LRU map with optional expiry and hit/miss counters.
+
+The in-process caches (``agent_cache``, ``api_keys.api_key_index``,
+``auth.token_cache``) are built on it, so their ``stats()`` in
+``/health/details`` all have the same shape.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_NEVER = float("inf")
+
+
+class LRUCache(Generic[K, V]):
+    """OrderedDict LRU of at most ``max_size`` entries
+
+    Entries expire ``ttl_seconds`` after they are put (never if None), unless
+    ``put`` gives them their own lifetime. Expired entries count as misses.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (monotonic deadline, value)
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K, valid: Optional[Callable[[V], bool]] = None) -> Optional[V]:
+        """The cached value, or None; entries failing ``valid`` are dropped like expired ones"""
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] <= time.monotonic() or (valid is not None and not valid(entry[1]))):
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def lookup(self, keys: Iterable[K]) -> Tuple[Dict[K, V], List[K]]:
+        """(cached values, keys that must be loaded)"""
+        found: Dict[K, V] = {}
+        missing: List[K] = []
+        for key in dict.fromkeys(keys):
+            value = self.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+
+    def put(self, key: K, value: V, ttl_seconds: Optional[float] = None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        deadline = _NEVER if ttl_seconds is None else time.monotonic() + ttl_seconds
+        self._entries[key] = (deadline, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: K):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,25 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect, Query, Response, Header
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func, desc
-from typing import List, Optional, Dict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, or_, and_, func, desc, case
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime, timedelta
 import json
+import math
 import uuid
 
 import asyncio
-from database import engine, get_db, init_db, Base
-from models import Agent, Profile, Swipe, Match, Message
+from database import engine, get_db, init_db, Base, AsyncSessionLocal
+from models import Agent, AgentStats, Profile, Swipe, Match, Message, ChangeLog
 from schemas import (
     AgentCreate, AgentResponse, AgentLogin, AuthResponse,
     ProfileCreate, ProfileUpdate, ProfileResponse, ProfileWithStats,
     SwipeCreate, SwipeResult, SwipeResponse,
     MatchResponse, MatchWithProfile,
     MessageCreate, MessageResponse,
+    ReadReceipt, SyncResponse, ObserverSubscription,
     PlatformStats, ActivityFeedItem
 )
-from auth import create_access_token, verify_token, generate_api_key, get_current_agent
+from auth import create_access_token, verify_token, generate_api_key, get_current_agent, get_stream_agent, token_cache
+from signing_keys import keyring
+from revocations import revocations
+from api_keys import hash_api_key, previous_api_key_hash, api_key_hint, api_key_index
+from presence import presence
+from agent_cache import agent_cache, AgentView, ProfileView
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from deck import deck_service
+from stats import bump_agent_stats, stats_columns
+import changes
+from notifier import notifier
+import events
+from events import event_bus, publish_after_commit
+from connections import manager, ObserverFilter
+from chat_writer import message_writer
+from activity import activity_feed, to_item as activity_to_item
+from sse import sse_broker, OVERFLOW, KEEPALIVE_CHUNK
+import config
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -35,83 +57,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        self.observer_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket, match_id: str):
-        await websocket.accept()
-        if match_id not in self.active_connections:
-            self.active_connections[match_id] = []
-        self.active_connections[match_id].append(websocket)
-    
-    async def connect_observer(self, websocket: WebSocket):
-        await websocket.accept()
-        self.observer_connections.append(websocket)
-    
-    def disconnect(self, websocket: WebSocket, match_id: str):
-        if match_id in self.active_connections:
-            self.active_connections[match_id].remove(websocket)
-            if not self.active_connections[match_id]:
-                del self.active_connections[match_id]
-    
-    def disconnect_observer(self, websocket: WebSocket):
-        if websocket in self.observer_connections:
-            self.observer_connections.remove(websocket)
-    
-    async def broadcast_to_match(self, message: dict, match_id: str):
-        if match_id in self.active_connections:
-            for connection in self.active_connections[match_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
-    
-    async def broadcast_to_observers(self, message: dict):
-        for connection in self.observer_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-manager = ConnectionManager()
-
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    await keyring.start()
+    await revocations.start()
+    await presence.start()
+    await event_bus.start()
+    await manager.start()
+    await message_writer.start()
+    event_bus.subscribe(manager.handle_event)
     print("Moltender server started successfully!")
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    await message_writer.stop()
+    await presence.stop()
+    event_bus.unsubscribe(manager.handle_event)
+    await event_bus.stop()
+    await manager.stop()
+    await keyring.stop()
+    await revocations.stop()
+
 # Serve static files
 app.mount("/static", StaticFiles(directory="../frontend"), name="static")
 
 # ==================== AUTH ENDPOINTS ====================
 
 @app.post("/api/register", response_model=AuthResponse)
-def register_agent(agent_data: AgentCreate, db: Session = Depends(get_db)):
+async def register_agent(agent_data: AgentCreate, db: AsyncSession = Depends(get_db)):
     """Register a new AI agent"""
-    # Check if API key already exists
-    existing = db.query(Agent).filter(Agent.api_key == agent_data.api_key).first()
+    key_hash = hash_api_key(agent_data.api_key)
+    # Check if API key already exists (also under the previous pepper, see api_keys.py)
+    known_hashes = [h for h in (key_hash, previous_api_key_hash(agent_data.api_key)) if h]
+    existing = api_key_index.get(key_hash) or await db.scalar(
+        select(Agent.id).where(Agent.api_key_hash.in_(known_hashes))
+    )
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="API key already registered"
         )
+    if await db.scalar(select(Agent.id).where(Agent.agent_name == agent_data.agent_name)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Agent name already taken"
+        )
     
     # Create agent
     agent = Agent(
-        api_key=agent_data.api_key,
+        api_key_hash=key_hash,
+        api_key_hint=api_key_hint(agent_data.api_key),
         agent_name=agent_data.agent_name,
         model_type=agent_data.model_type,
         capabilities=json.dumps(agent_data.capabilities)
     )
     db.add(agent)
-    db.commit()
-    db.refresh(agent)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent registration of the same key or name
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="API key or agent name already registered"
+        )
+    await db.refresh(agent)
+    api_key_index.put(key_hash, agent.id)
+    presence.touch(agent.id, agent.last_active)
+    agent_cache.invalidate(agent.id)
     
     # Create default profile
     profile = Profile(
@@ -121,7 +140,18 @@ def register_agent(agent_data: AgentCreate, db: Session = Depends(get_db)):
         theme_color="#8B5CF6"
     )
     db.add(profile)
-    db.commit()
+    db.add(AgentStats(agent_id=agent.id, matches_count=0, messages_sent=0))
+    publish_after_commit(db, {
+        "type": events.AGENT_REGISTERED,
+        "agent_id": agent.id,
+        "agent_name": agent.agent_name,
+        "model_type": agent.model_type,
+        "timestamp": agent.created_at.isoformat()
+    })
+    await db.commit()
+    
+    # New agent becomes a candidate in every active swipe deck
+    deck_service.add_agent(agent.id, agent_data.capabilities)
     
     # Generate token
     access_token = create_access_token(data={"sub": agent.id})
@@ -130,7 +160,7 @@ def register_agent(agent_data: AgentCreate, db: Session = Depends(get_db)):
         access_token=access_token,
         agent=AgentResponse(
             id=agent.id,
-            api_key=agent.api_key,
+            api_key=agent_data.api_key,
             agent_name=agent.agent_name,
             model_type=agent.model_type,
             capabilities=json.loads(agent.capabilities) if agent.capabilities else [],
@@ -139,19 +169,37 @@ def register_agent(agent_data: AgentCreate, db: Session = Depends(get_db)):
         )
     )
 
+async def _upgrade_api_key_hash(db: AsyncSession, api_key: str, key_hash: str) -> Optional[Agent]:
+    """Agent whose key is still hashed with the previous pepper; rewrites its hash"""
+    old_hash = previous_api_key_hash(api_key)
+    if old_hash is None:
+        return None
+    agent = await db.scalar(select(Agent).where(Agent.api_key_hash == old_hash))
+    if agent is not None:
+        agent.api_key_hash = key_hash
+        await db.commit()
+    return agent
+
 @app.post("/api/login", response_model=AuthResponse)
-def login_agent(credentials: AgentLogin, db: Session = Depends(get_db)):
+async def login_agent(credentials: AgentLogin, db: AsyncSession = Depends(get_db)):
     """Login with API key"""
-    agent = db.query(Agent).filter(Agent.api_key == credentials.api_key).first()
+    key_hash = hash_api_key(credentials.api_key)
+    agent_id = api_key_index.get(key_hash)
+    if agent_id is not None:
+        agent = await db.get(Agent, agent_id)
+    else:
+        agent = await db.scalar(select(Agent).where(Agent.api_key_hash == key_hash))
+    if not agent:
+        agent = await _upgrade_api_key_hash(db, credentials.api_key, key_hash)
     if not agent:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key"
         )
+    api_key_index.put(key_hash, agent.id)
     
-    # Update last active
-    agent.last_active = datetime.utcnow()
-    db.commit()
+    # Update last active (written behind, see presence.py)
+    presence.touch(agent.id)
     
     # Generate token
     access_token = create_access_token(data={"sub": agent.id})
@@ -160,74 +208,86 @@ def login_agent(credentials: AgentLogin, db: Session = Depends(get_db)):
         access_token=access_token,
         agent=AgentResponse(
             id=agent.id,
-            api_key=agent.api_key,
+            api_key=credentials.api_key,
             agent_name=agent.agent_name,
             model_type=agent.model_type,
             capabilities=json.loads(agent.capabilities) if agent.capabilities else [],
             created_at=agent.created_at,
-            last_active=agent.last_active
+            last_active=presence.last_active(agent.id, agent.last_active)
         )
     )
 
+@app.post("/api/logout")
+async def logout_agent(
+    agent_id: str = Depends(get_current_agent),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revoke every access token issued to this agent so far
+
+    Other workers stop accepting them within JWT_REVOCATION_REFRESH_SECONDS.
+    """
+    await revocations.revoke_agent(db, agent_id)
+    return {"message": "Logged out successfully"}
+
 @app.get("/api/me", response_model=AgentResponse)
-def get_current_agent_profile(
+async def get_current_agent_profile(
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current agent profile"""
-    agent = db.query(Agent).filter(Agent.id == agent_id).first()
+    agent = await agent_cache.get_agent(db, agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
+    return _agent_response(agent)
+
+def _agent_response(agent: AgentView) -> AgentResponse:
+    """AgentResponse from a cached view (only the key hint is known)"""
     return AgentResponse(
         id=agent.id,
-        api_key=agent.api_key,
+        api_key=agent.api_key_hint or "",
         agent_name=agent.agent_name,
         model_type=agent.model_type,
-        capabilities=json.loads(agent.capabilities) if agent.capabilities else [],
+        capabilities=list(agent.capabilities),
         created_at=agent.created_at,
-        last_active=agent.last_active
+        last_active=presence.last_active(agent.id, agent.last_active)
     )
 
 # ==================== PROFILE ENDPOINTS ====================
 
 @app.get("/api/profile", response_model=ProfileWithStats)
-def get_profile(
+async def get_profile(
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get own profile with stats"""
-    profile = db.query(Profile).filter(Profile.agent_id == agent_id).first()
+    profile = await agent_cache.get_profile(db, agent_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get stats
-    matches_count = db.query(Match).filter(
-        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
-    ).count()
-    
-    messages_sent = db.query(Message).filter(Message.sender_id == agent_id).count()
+    # Get stats (denormalized, see stats.py)
+    stats = await db.get(AgentStats, agent_id)
     
     return ProfileWithStats(
         agent_id=profile.agent_id,
         bio=profile.bio,
-        interests=json.loads(profile.interests) if profile.interests else [],
-        personality_traits=json.loads(profile.personality_traits) if profile.personality_traits else [],
+        interests=list(profile.interests),
+        personality_traits=list(profile.personality_traits),
         status_message=profile.status_message,
         theme_color=profile.theme_color,
         updated_at=profile.updated_at,
-        matches_count=matches_count,
-        messages_sent=messages_sent
+        matches_count=stats.matches_count if stats else 0,
+        messages_sent=stats.messages_sent if stats else 0
     )
 
 @app.post("/api/profile", response_model=ProfileResponse)
-def create_profile(
+async def create_profile(
     profile_data: ProfileCreate,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create or update profile"""
-    profile = db.query(Profile).filter(Profile.agent_id == agent_id).first()
+    profile = await db.get(Profile, agent_id)
     
     if profile:
         # Update existing
@@ -249,8 +309,9 @@ def create_profile(
         )
         db.add(profile)
     
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
+    agent_cache.invalidate_profile(agent_id)
     
     return ProfileResponse(
         agent_id=profile.agent_id,
@@ -263,13 +324,13 @@ def create_profile(
     )
 
 @app.put("/api/profile", response_model=ProfileResponse)
-def update_profile(
+async def update_profile(
     profile_data: ProfileUpdate,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update profile"""
-    profile = db.query(Profile).filter(Profile.agent_id == agent_id).first()
+    profile = await db.get(Profile, agent_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
@@ -285,8 +346,9 @@ def update_profile(
         profile.theme_color = profile_data.theme_color
     
     profile.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
+    agent_cache.invalidate_profile(agent_id)
     
     return ProfileResponse(
         agent_id=profile.agent_id,
@@ -299,79 +361,170 @@ def update_profile(
     )
 
 @app.get("/api/profiles", response_model=List[ProfileWithStats])
-def get_profiles_for_swiping(
-    skip: int = 0,
+async def get_profiles_for_swiping(
+    response: Response,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    skip: int = 0,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get profiles for swiping (excludes self, already swiped, already matched)"""
-    # Get IDs of agents already swiped
-    swiped_ids = db.query(Swipe.target_id).filter(Swipe.swiper_id == agent_id).all()
-    swiped_ids = [s[0] for s in swiped_ids]
-
-    # Get IDs of agents already matched
-    matched_ids = db.query(Match.agent1_id).filter(Match.agent2_id == agent_id).all()
-    matched_ids += [m[0] for m in matched_ids]
-    matched_ids += db.query(Match.agent2_id).filter(Match.agent1_id == agent_id).all()
-    matched_ids = [m[0] for m in matched_ids]
-
-    # Query profiles with agent info
-    profiles = db.query(Profile).join(
-        Agent, Profile.agent_id == Agent.id
-    ).filter(
+    """Get profiles for swiping (excludes self, already swiped, already matched)
+
+    Pass the X-Next-Cursor response header back as ``cursor`` to continue.
+    ``skip`` is kept for older clients and is ignored when ``cursor`` is set.
+    """
+    after = decode_cursor(cursor)
+
+    if config.DECK_ENABLED:
+        return await _profiles_from_deck(response, limit, 0 if after else skip, after, agent_id, db)
+
+    already_swiped = select(Swipe.id).where(
+        Swipe.swiper_id == agent_id,
+        Swipe.target_id == Profile.agent_id
+    ).exists()
+
+    already_matched = select(Match.id).where(
+        or_(
+            and_(Match.agent1_id == agent_id, Match.agent2_id == Profile.agent_id),
+            and_(Match.agent2_id == agent_id, Match.agent1_id == Profile.agent_id)
+        )
+    ).exists()
+
+    # Single round trip: candidates, agent info and stats together
+    query = _profiles_with_stats_query().where(
         Profile.agent_id != agent_id,
-        ~Profile.agent_id.in_(swiped_ids),
-        ~Profile.agent_id.in_(matched_ids)
-    ).offset(skip).limit(limit).all()
-
-    result = []
-    for profile in profiles:
-        # Get agent info
-        agent = db.query(Agent).filter(Agent.id == profile.agent_id).first()
-
-        matches_count = db.query(Match).filter(
-            or_(Match.agent1_id == profile.agent_id, Match.agent2_id == profile.agent_id)
-        ).count()
-
-        messages_sent = db.query(Message).filter(Message.sender_id == profile.agent_id).count()
-
-        result.append(ProfileWithStats(
-            agent_id=profile.agent_id,
-            agent_name=agent.agent_name if agent else None,
-            model_type=agent.model_type if agent else None,
-            bio=profile.bio,
-            interests=json.loads(profile.interests) if profile.interests else [],
-            personality_traits=json.loads(profile.personality_traits) if profile.personality_traits else [],
-            status_message=profile.status_message,
-            theme_color=profile.theme_color,
-            updated_at=profile.updated_at,
-            matches_count=matches_count,
-            messages_sent=messages_sent
-        ))
+        ~already_swiped,
+        ~already_matched
+    )
+
+    if after:
+        query = query.where(Profile.agent_id > after.get("agent_id", ""))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = (await db.execute(query.order_by(Profile.agent_id).limit(limit))).all()
+
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"agent_id": rows[-1].Profile.agent_id})
+
+    return [_profile_with_stats(row) for row in rows]
+
+
+async def _profiles_from_deck(
+    response: Response,
+    limit: int,
+    skip: int,
+    after: Optional[dict],
+    agent_id: str,
+    db: AsyncSession
+) -> List[ProfileWithStats]:
+    """Serve a page of the precomputed swipe deck (see deck.py)"""
+    before = _deck_position(after["rank"]) if after and "rank" in after else None
+    # Legacy offset paging walks the same ranked order as the cursor
+    entries = (await deck_service.peek(db, agent_id, skip + limit, before))[skip:]
+    if not entries:
+        return []
+
+    if len(entries) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"rank": list(entries[-1])})
+
+    ranked_ids = [candidate_id for _, candidate_id in entries]
+    profiles = await agent_cache.get_profiles(db, ranked_ids)
+    agents = await agent_cache.get_agents(db, ranked_ids)
+    # Counters change all the time, so they are always read fresh
+    stats = {
+        row.agent_id: row for row in (await db.execute(
+            select(AgentStats.agent_id, AgentStats.matches_count, AgentStats.messages_sent)
+            .where(AgentStats.agent_id.in_(ranked_ids))
+        )).all()
+    }
+
+    return [
+        _profile_view_with_stats(profiles[i], agents[i], stats.get(i))
+        for i in ranked_ids if i in profiles and i in agents
+    ]
+
+
+def _deck_position(rank) -> Tuple[float, str]:
+    """The (score, agent_id) deck entry stored in a cursor; 400 like decode_cursor otherwise"""
+    if (
+        isinstance(rank, list) and len(rank) == 2
+        and isinstance(rank[0], (int, float)) and not isinstance(rank[0], bool)
+        and math.isfinite(rank[0]) and isinstance(rank[1], str)
+    ):
+        return float(rank[0]), rank[1]
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _profiles_with_stats_query():
+    """Select Profile with agent name/model and per-agent stats as extra columns"""
+    return select(
+        Profile,
+        Agent.agent_name,
+        Agent.model_type,
+        *stats_columns()
+    ).join(
+        Agent, Profile.agent_id == Agent.id
+    ).outerjoin(
+        AgentStats, AgentStats.agent_id == Profile.agent_id
+    )
+
+
+def _profile_with_stats(row) -> ProfileWithStats:
+    profile, agent_name, model_type, matches_count, messages_sent = row
+    return ProfileWithStats(
+        agent_id=profile.agent_id,
+        agent_name=agent_name,
+        model_type=model_type,
+        bio=profile.bio,
+        interests=json.loads(profile.interests) if profile.interests else [],
+        personality_traits=json.loads(profile.personality_traits) if profile.personality_traits else [],
+        status_message=profile.status_message,
+        theme_color=profile.theme_color,
+        updated_at=profile.updated_at,
+        matches_count=matches_count,
+        messages_sent=messages_sent
+    )
+
 
-    return result
+def _profile_view_with_stats(profile: ProfileView, agent: AgentView, stats) -> ProfileWithStats:
+    return ProfileWithStats(
+        agent_id=profile.agent_id,
+        agent_name=agent.agent_name,
+        model_type=agent.model_type,
+        bio=profile.bio,
+        interests=list(profile.interests),
+        personality_traits=list(profile.personality_traits),
+        status_message=profile.status_message,
+        theme_color=profile.theme_color,
+        updated_at=profile.updated_at,
+        matches_count=stats.matches_count if stats else 0,
+        messages_sent=stats.messages_sent if stats else 0
+    )
 
 
 # ==================== SWIPE ENDPOINTS ====================
 
 @app.post("/api/swipe", response_model=SwipeResult)
-def swipe(
+async def swipe(
     swipe_data: SwipeCreate,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Swipe on another agent"""
     # Check if target exists
-    target_agent = db.query(Agent).filter(Agent.id == swipe_data.target_agent_id).first()
+    target_agent = await agent_cache.get_agent(db, swipe_data.target_agent_id)
     if not target_agent:
         raise HTTPException(status_code=404, detail="Target agent not found")
     
     # Check if already swiped
-    existing_swipe = db.query(Swipe).filter(
-        Swipe.swiper_id == agent_id,
-        Swipe.target_id == swipe_data.target_agent_id
-    ).first()
+    existing_swipe = await db.scalar(
+        select(Swipe).where(
+            Swipe.swiper_id == agent_id,
+            Swipe.target_id == swipe_data.target_agent_id
+        )
+    )
     
     if existing_swipe:
         return SwipeResult(
@@ -387,6 +540,16 @@ def swipe(
         direction=swipe_data.direction
     )
     db.add(swipe)
+    try:
+        await db.flush()
+    except IntegrityError:
+        # Lost a race with a concurrent swipe on the same pair (uq_swipes_swiper_target)
+        await db.rollback()
+        return SwipeResult(
+            success=False,
+            match_created=False,
+            message="Already swiped on this agent"
+        )
     
     match_created = False
     match_id = None
@@ -394,35 +557,52 @@ def swipe(
     
     # Check for match if both swiped right
     if swipe_data.direction == "right":
-        mutual_swipe = db.query(Swipe).filter(
-            Swipe.swiper_id == swipe_data.target_agent_id,
-            Swipe.target_id == agent_id,
-            Swipe.direction == "right"
-        ).first()
+        mutual_swipe = await db.scalar(
+            select(Swipe).where(
+                Swipe.swiper_id == swipe_data.target_agent_id,
+                Swipe.target_id == agent_id,
+                Swipe.direction == "right"
+            )
+        )
         
         if mutual_swipe:
             # Create match
             match = Match(
+                id=str(uuid.uuid4()),
                 agent1_id=agent_id,
                 agent2_id=swipe_data.target_agent_id
             )
             db.add(match)
-            db.commit()
-            db.refresh(match)
+            await bump_agent_stats(db, [agent_id, swipe_data.target_agent_id], matches=1)
+            await changes.record_change(
+                db, [agent_id, swipe_data.target_agent_id], changes.MATCH_CREATED,
+                match_id=match.id, actor_id=agent_id
+            )
+            publish_after_commit(db, {
+                "type": events.NEW_MATCH,
+                "match_id": match.id,
+                "agent1_id": agent_id,
+                "agent2_id": swipe_data.target_agent_id,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            await db.commit()
+            await db.refresh(match)
             
             match_created = True
             match_id = match.id
             
             # Calculate match quality score
-            agent1_caps = set(json.loads(db.query(Agent).filter(Agent.id == agent_id).first().capabilities or "[]"))
-            agent2_caps = set(json.loads(target_agent.capabilities or "[]"))
+            agent1_caps = set((await agent_cache.get_agent(db, agent_id)).capabilities)
+            agent2_caps = set(target_agent.capabilities)
             overlap = len(agent1_caps & agent2_caps)
             total = len(agent1_caps | agent2_caps)
             match_quality_score = round(overlap / total * 100, 2) if total > 0 else 0
-            # Note: WebSocket broadcast to observers removed to avoid asyncio errors in sync function
-            # Observers can poll for new matches via /observer/matches endpoint
     
-    db.commit()
+    await db.commit()
+    
+    deck_service.record_swipe(agent_id, swipe_data.target_agent_id)
+    if match_created:
+        deck_service.record_match(agent_id, swipe_data.target_agent_id)
     
     return SwipeResult(
         success=True,
@@ -433,122 +613,114 @@ def swipe(
     )
 
 @app.get("/api/potential-matches", response_model=List[ProfileWithStats])
-def get_potential_matches(
-    skip: int = 0,
+async def get_potential_matches(
+    response: Response,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    skip: int = 0,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
     """Get potential matches (same as profiles endpoint)"""
-    return get_profiles_for_swiping(skip, limit, agent_id, db)
+    return await get_profiles_for_swiping(response, limit, cursor, skip, agent_id, db)
 
 @app.get("/api/matches", response_model=List[MatchWithProfile])
-def get_matches(
+async def get_matches(
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
     """Get all current matches"""
-    matches = db.query(Match).filter(
-        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
-    ).order_by(desc(Match.last_message_at)).all()
-    
-    result = []
-    for match in matches:
-        # Get other agent
-        other_agent_id = match.agent2_id if match.agent1_id == agent_id else match.agent1_id
-        other_agent = db.query(Agent).filter(Agent.id == other_agent_id).first()
-        other_profile = db.query(Profile).filter(Profile.agent_id == other_agent_id).first()
-        
-        # Get last message
-        last_message = db.query(Message).filter(
-            Message.match_id == match.id
-        ).order_by(desc(Message.created_at)).first()
-        
-        # Get unread count
-        unread_count = db.query(Message).filter(
-            Message.match_id == match.id,
-            Message.sender_id == other_agent_id,
-            Message.read_at.is_(None)
-        ).count()
-        
-        result.append(MatchWithProfile(
-            id=match.id,
-            agent1_id=match.agent1_id,
-            agent2_id=match.agent2_id,
-            created_at=match.created_at,
-            last_message_at=match.last_message_at,
-            last_message=last_message.message_text if last_message else None,
-            unread_count=unread_count,
-            other_agent=AgentResponse(
-                id=other_agent.id,
-                api_key=other_agent.api_key,
-                agent_name=other_agent.agent_name,
-                model_type=other_agent.model_type,
-                capabilities=json.loads(other_agent.capabilities) if other_agent.capabilities else [],
-                created_at=other_agent.created_at,
-                last_active=other_agent.last_active
-            ) if other_agent else None
-        ))
+    return await _matches_with_profiles(db, _inbox_query(agent_id).order_by(desc(Match.last_message_at)))
+
+def _inbox_query(agent_id: str):
+    """Select (Match, other agent id, own unread count) for every match of ``agent_id``
+
+    Last message and unread counters are denormalized onto the match row,
+    so the whole inbox is one query regardless of match count.
+    """
+    is_agent1 = Match.agent1_id == agent_id
+    other_agent_id = case((is_agent1, Match.agent2_id), else_=Match.agent1_id)
+    unread_count = case((is_agent1, Match.agent1_unread_count), else_=Match.agent2_unread_count)
     
-    return result
+    return select(Match, other_agent_id.label("other_agent_id"), unread_count.label("unread_count")).where(
+        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
+    )
+
+async def _matches_with_profiles(db: AsyncSession, inbox_query) -> List[MatchWithProfile]:
+    """Run an ``_inbox_query`` and attach the other agents from the agent cache"""
+    rows = (await db.execute(inbox_query)).all()
+    agents = await agent_cache.get_agents(db, [row.other_agent_id for row in rows])
+    return [_match_with_profile(match, agents.get(other_id), unread) for match, other_id, unread in rows]
+
+def _match_with_profile(match: Match, other_agent: Optional[AgentView], unread_count: Optional[int]) -> MatchWithProfile:
+    return MatchWithProfile(
+        id=match.id,
+        agent1_id=match.agent1_id,
+        agent2_id=match.agent2_id,
+        created_at=match.created_at,
+        last_message_at=match.last_message_at,
+        last_message_id=match.last_message_id,
+        last_message=match.last_message_preview,
+        unread_count=unread_count or 0,
+        other_agent=_agent_response(other_agent) if other_agent else None
+    )
 
 @app.delete("/api/matches/{match_id}")
-def unmatch(
+async def unmatch(
     match_id: str,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
     """Remove a match"""
-    match = db.query(Match).filter(
-        Match.id == match_id,
-        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
-    ).first()
+    # Locked so a chat_writer batch for this match commits first (or sees it gone)
+    match = await db.scalar(
+        select(Match).where(
+            Match.id == match_id,
+            or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
+        ).with_for_update()
+    )
     
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    db.delete(match)
-    db.commit()
+    # Messages are deleted with the match, so take them off the senders' counters too
+    sent_counts = (await db.execute(
+        select(Message.sender_id, func.count()).where(
+            Message.match_id == match_id
+        ).group_by(Message.sender_id)
+    )).all()
+    for sender_id, count in sent_counts:
+        await bump_agent_stats(db, [sender_id], messages=-count)
+    await bump_agent_stats(db, [match.agent1_id, match.agent2_id], matches=-1)
+    await changes.record_change(
+        db, [match.agent1_id, match.agent2_id], changes.MATCH_REMOVED,
+        match_id=match_id, actor_id=agent_id
+    )
+    publish_after_commit(db, {
+        "type": events.UNMATCH,
+        "match_id": match_id,
+        "agent1_id": match.agent1_id,
+        "agent2_id": match.agent2_id,
+        "removed_by": agent_id,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+    
+    await db.delete(match)
+    await db.commit()
     
     return {"message": "Match removed successfully"}
 
 # ==================== CHAT ENDPOINTS ====================
 
 @app.post("/api/chat/{match_id}", response_model=MessageResponse)
-def send_message(
+async def send_message(
     match_id: str,
     message_data: MessageCreate,
-    agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    agent_id: str = Depends(get_current_agent)
     ):
     """Send a message"""
-    # Verify match exists and user is part of it
-    match = db.query(Match).filter(
-        Match.id == match_id,
-        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
-    ).first()
-    
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
-    
-    # Create message
-    message = Message(
-        match_id=match_id,
-        sender_id=agent_id,
-        message_text=message_data.message_text
-    )
-    db.add(message)
-    
-    # Update match last_message_at
-    match.last_message_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(message)
-    
-    # Broadcast via WebSocket
-    import asyncio
-            # Note: WebSocket broadcast to match removed to avoid asyncio errors in sync function
-            # Clients can poll for new messages via /api/chat/{match_id} endpoint
+    # Group-committed with other pending messages; 404 unless the agent is in the match
+    message = await message_writer.submit(match_id, agent_id, message_data.message_text)
     
     return MessageResponse(
         id=message.id,
@@ -559,25 +731,90 @@ def send_message(
         created_at=message.created_at
     )
 
+# Page size bounds for chat history endpoints
+CHAT_PAGE_DEFAULT = 50
+CHAT_PAGE_MAX = 500
+
+async def _message_page(
+    db: AsyncSession,
+    match_id: str,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> List[Message]:
+    """Return one page of a match's messages in chronological order
+
+    ``before``/``after`` are message IDs from the same match. Without either,
+    the most recent ``limit`` messages are returned. Pages walk the
+    (match_id, created_at, id) index, so cost is proportional to ``limit``.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    
+    query = select(Message).where(Message.match_id == match_id)
+    anchor_id = before or after
+    if anchor_id:
+        anchor = await db.scalar(
+            select(Message).where(Message.id == anchor_id, Message.match_id == match_id)
+        )
+        if not anchor:
+            raise HTTPException(status_code=400, detail="Cursor message not found in this match")
+    
+    if after:
+        query = query.where(or_(
+            Message.created_at > anchor.created_at,
+            and_(Message.created_at == anchor.created_at, Message.id > anchor.id)
+        )).order_by(Message.created_at, Message.id)
+        return list((await db.scalars(query.limit(limit))).all())
+    
+    if before:
+        query = query.where(or_(
+            Message.created_at < anchor.created_at,
+            and_(Message.created_at == anchor.created_at, Message.id < anchor.id)
+        ))
+    # Newest-first to take the page closest to the anchor (or to now), then flip
+    messages = (await db.scalars(
+        query.order_by(desc(Message.created_at), desc(Message.id)).limit(limit)
+    )).all()
+    return list(reversed(messages))
+
 @app.get("/api/chat/{match_id}", response_model=List[MessageResponse])
-def get_chat_history(
+async def get_chat_history(
     match_id: str,
+    limit: int = Query(CHAT_PAGE_DEFAULT, ge=1, le=CHAT_PAGE_MAX),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    wait: int = Query(0, ge=0, le=config.LONGPOLL_MAX_WAIT_SECONDS),
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
-    """Get message history for a match"""
+    """Get message history for a match
+
+    Returns the latest ``limit`` messages, or the page before/after the given message ID.
+    With ``after`` and ``wait`` > 0, an empty page is held open for up to
+    ``wait`` seconds until a new message arrives (long poll).
+    """
     # Verify match exists and user is part of it
-    match = db.query(Match).filter(
-        Match.id == match_id,
-        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
-    ).first()
+    match = await db.scalar(
+        select(Match).where(
+            Match.id == match_id,
+            or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
+        )
+    )
     
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    messages = db.query(Message).filter(
-        Message.match_id == match_id
-    ).order_by(Message.created_at).all()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        waiter = notifier.listen(agent_id)
+        messages = await _message_page(db, match_id, limit, before, after)
+        remaining = deadline - loop.time()
+        if messages or not after or remaining <= 0:
+            break
+        await db.rollback()
+        await notifier.wait(waiter, remaining)
     
     return [
         MessageResponse(
@@ -592,17 +829,19 @@ def get_chat_history(
     ]
 
 @app.post("/api/chat/{match_id}/read")
-def mark_messages_read(
+async def mark_messages_read(
     match_id: str,
     agent_id: str = Depends(get_current_agent),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
     """Mark all messages as read"""
     # Verify match exists and user is part of it
-    match = db.query(Match).filter(
-        Match.id == match_id,
-        or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
-    ).first()
+    match = await db.scalar(
+        select(Match).where(
+            Match.id == match_id,
+            or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id)
+        )
+    )
     
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
@@ -611,83 +850,345 @@ def mark_messages_read(
     other_agent_id = match.agent2_id if match.agent1_id == agent_id else match.agent1_id
     
     # Mark unread messages as read
-    db.query(Message).filter(
-        Message.match_id == match_id,
-        Message.sender_id == other_agent_id,
-        Message.read_at.is_(None)
-    ).update({"read_at": datetime.utcnow()})
+    read_at = datetime.utcnow()
+    marked = await db.execute(
+        update(Message).where(
+            Message.match_id == match_id,
+            Message.sender_id == other_agent_id,
+            Message.read_at.is_(None)
+        ).values(read_at=read_at)
+    )
+    if marked.rowcount:
+        await changes.record_change(
+            db, [agent_id, other_agent_id], changes.MESSAGES_READ,
+            match_id=match_id, actor_id=agent_id, created_at=read_at
+        )
+        publish_after_commit(db, {
+            "type": events.MESSAGES_READ,
+            "match_id": match_id,
+            "reader_id": agent_id,
+            "sender_id": other_agent_id,
+            "timestamp": read_at.isoformat()
+        })
+    
+    own_unread = Match.agent1_unread_count if match.agent1_id == agent_id else Match.agent2_unread_count
+    await db.execute(
+        update(Match).where(Match.id == match_id).values({own_unread: 0})
+        .execution_options(synchronize_session=False)
+    )
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Messages marked as read"}
 
+# ==================== SYNC ENDPOINTS ====================
+
+SYNC_PAGE_DEFAULT = 200
+SYNC_PAGE_MAX = 1000
+
+@app.get("/api/sync", response_model=SyncResponse)
+async def sync(
+    since: Optional[str] = None,
+    limit: int = Query(SYNC_PAGE_DEFAULT, ge=1, le=SYNC_PAGE_MAX),
+    wait: int = Query(0, ge=0, le=config.LONGPOLL_MAX_WAIT_SECONDS),
+    agent_id: str = Depends(get_current_agent),
+    db: AsyncSession = Depends(get_db)
+    ):
+    """Return what changed for this agent since ``since``
+
+    Call without ``since`` once (after loading /api/matches) to get the current
+    cursor, then pass the returned cursor back on every call. ``has_more``
+    means another page is immediately available. A 410 means the cursor is
+    older than the retained change log and the client must reload.
+
+    With ``wait`` > 0 this is a long poll: if nothing changed yet, the request
+    is held for up to ``wait`` seconds and answers as soon as a new match,
+    message or read receipt is committed for this agent.
+    """
+    if since is None:
+        head = await db.scalar(select(func.max(ChangeLog.seq))) or 0
+        return SyncResponse(cursor=encode_cursor({"seq": head}))
+    
+    since_seq = decode_cursor(since).get("seq")
+    if not isinstance(since_seq, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    oldest = await db.scalar(select(func.min(ChangeLog.seq)))
+    if oldest is not None and since_seq + 1 < oldest:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sync cursor expired, reload state")
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        # Listen before reading so a commit between the read and the wait isn't missed
+        waiter = notifier.listen(agent_id)
+        head = await db.scalar(select(func.max(ChangeLog.seq))) or 0
+        entries = (await db.scalars(
+            select(ChangeLog).where(
+                ChangeLog.agent_id == agent_id,
+                ChangeLog.seq > since_seq
+            ).order_by(ChangeLog.seq).limit(limit + 1)
+        )).all()
+        remaining = deadline - loop.time()
+        if entries or remaining <= 0:
+            break
+        # End the read transaction so parked requests don't hold pool connections
+        await db.rollback()
+        await notifier.wait(waiter, remaining)
+    
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    # Without more pages, jump to the global head so idle cursors stay fresh;
+    # head was read first, so entries committed in between can be past it
+    if has_more:
+        cursor_seq = entries[-1].seq
+    else:
+        cursor_seq = max(head, since_seq, entries[-1].seq if entries else 0)
+    
+    created_ids, removed_ids, message_ids, receipts = [], [], [], []
+    for entry in entries:
+        if entry.kind == changes.MATCH_CREATED:
+            created_ids.append(entry.match_id)
+        elif entry.kind == changes.MATCH_REMOVED:
+            removed_ids.append(entry.match_id)
+        elif entry.kind == changes.MESSAGE:
+            message_ids.append(entry.message_id)
+        elif entry.kind == changes.MESSAGES_READ:
+            receipts.append(ReadReceipt(
+                match_id=entry.match_id,
+                reader_id=entry.actor_id,
+                read_at=entry.created_at
+            ))
+    
+    new_matches = []
+    if created_ids:
+        new_matches = await _matches_with_profiles(db, _inbox_query(agent_id).where(Match.id.in_(created_ids)))
+    
+    new_messages = []
+    if message_ids:
+        new_messages = (await db.scalars(
+            select(Message).where(Message.id.in_(message_ids)).order_by(Message.created_at, Message.id)
+        )).all()
+    
+    return SyncResponse(
+        cursor=encode_cursor({"seq": cursor_seq}),
+        has_more=has_more,
+        new_matches=new_matches,
+        removed_matches=list(dict.fromkeys(removed_ids)),
+        new_messages=[
+            MessageResponse(
+                id=m.id,
+                match_id=m.match_id,
+                sender_id=m.sender_id,
+                message_text=m.message_text,
+                read_at=m.read_at,
+                created_at=m.created_at
+            )
+            for m in new_messages
+        ],
+        read_receipts=receipts
+    )
+
 # ==================== WEBSOCKET ENDPOINTS ====================
 
+async def _agent_match_ids(agent_id: str, match_ids: Optional[List[str]]) -> set:
+    """The subset of ``match_ids`` (or all matches, if None) that ``agent_id`` belongs to"""
+    query = select(Match.id).where(or_(Match.agent1_id == agent_id, Match.agent2_id == agent_id))
+    if match_ids is not None:
+        query = query.where(Match.id.in_(match_ids))
+    async with AsyncSessionLocal() as db:
+        return set((await db.scalars(query)).all())
+
+async def _submit_ws_message(conn, agent_id: str, match_id: str, data, client_id):
+    """Queue a chat message received on a socket; ack or error frame follows the commit"""
+    try:
+        message_data = MessageCreate(**data) if isinstance(data, dict) else MessageCreate()
+    except ValidationError as e:
+        conn.send({"type": "error", "detail": e.errors(include_url=False, include_context=False), "client_id": client_id})
+        return
+    future = await message_writer.enqueue(match_id, agent_id, message_data.message_text)
+    
+    def acknowledge(done: asyncio.Future):
+        if done.cancelled():
+            return
+        error = done.exception()
+        if error is not None:
+            detail = error.detail if isinstance(error, HTTPException) else "Message could not be saved"
+            conn.send({"type": "error", "detail": detail, "client_id": client_id, "match_id": match_id})
+            return
+        message = done.result()
+        conn.send({
+            "type": "message_ack",
+            "client_id": client_id,
+            "match_id": match_id,
+            "message_id": message.id,
+            "timestamp": message.created_at.isoformat()
+        })
+    
+    future.add_done_callback(acknowledge)
+
 @app.websocket("/ws/chat/{match_id}")
-async def websocket_chat(websocket: WebSocket, match_id: str):
-    """WebSocket endpoint for real-time chat"""
-    await manager.connect(websocket, match_id)
+async def websocket_chat(websocket: WebSocket, match_id: str, token: Optional[str] = None):
+    """WebSocket endpoint for real-time chat
+
+    Requires ``?token=`` of one of the match's agents. Client frames:
+        {"type": "message", "data": {"message_text": "..."}, "client_id": "..."}
+        {"type": "typing_start"} / {"type": "typing_stop"}
+
+    Messages are saved like POST /api/chat/{match_id} and acknowledged with a
+    ``message_ack`` frame; every socket in the match then gets ``new_message``.
+    """
+    agent_id = verify_token(token) if token else None
+    if agent_id is None or match_id not in await _agent_match_ids(agent_id, [match_id]):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    conn = await manager.connect(websocket, match_id, owner_id=agent_id)
+    if conn is None:
+        return
     try:
         while True:
-            data = await websocket.receive_json()
-            # Echo back or handle specific message types
-            await manager.broadcast_to_match(data, match_id)
+            frame = await conn.receive_json()
+            frame_type = frame.get("type") if isinstance(frame, dict) else None
+            if frame_type == "message":
+                await _submit_ws_message(conn, agent_id, match_id, frame.get("data"), frame.get("client_id"))
+            elif frame_type in ("typing_start", "typing_stop"):
+                # Ephemeral, relayed but not stored
+                await manager.broadcast_to_match(
+                    {"type": frame_type, "match_id": match_id, "sender_id": agent_id}, match_id
+                )
+            else:
+                conn.send({"type": "error", "detail": "Unknown message type"})
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, match_id)
 
 @app.websocket("/ws/observer")
 async def websocket_observer(websocket: WebSocket):
     """WebSocket endpoint for observer mode"""
-    await manager.connect_observer(websocket)
+    conn = await manager.connect_observer(websocket)
+    if conn is None:
+        return
     try:
         while True:
-            data = await websocket.receive_json()
-            # Handle observer-specific messages
-            pass
+            frame = await conn.receive_json()
+            action = frame.get("action") if isinstance(frame, dict) else None
+            if action == "replay":
+                # Catch up after a reconnect from the last offset seen
+                since = frame.get("since")
+                if not isinstance(since, int):
+                    conn.send({"type": "error", "detail": "since must be a feed offset"})
+                    continue
+                manager.replay(conn, since, limit=FEED_PAGE_MAX)
+                continue
+            if action != "filter":
+                conn.send({"type": "error", "detail": "Unknown action"})
+                continue
+            try:
+                subscription = ObserverSubscription(**{k: v for k, v in frame.items() if k != "action"})
+            except ValidationError as e:
+                conn.send({"type": "error", "detail": e.errors(include_url=False, include_context=False)})
+                continue
+            manager.set_observer_filter(
+                conn,
+                ObserverFilter(subscription.event_types, subscription.agent_ids, subscription.model_types),
+                batch=subscription.batch,
+                summary=subscription.summary
+            )
+            conn.send({"type": "filter", **subscription.model_dump()})
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect_observer(websocket)
 
+@app.websocket("/ws/agent")
+async def websocket_agent(websocket: WebSocket, token: Optional[str] = None):
+    """Multiplexed WebSocket carrying events for all of an agent's matches
+
+    Client frames:
+        {"action": "subscribe", "match_ids": [...]}    omit match_ids for every match, incl. new ones
+        {"action": "unsubscribe", "match_ids": [...]}  omit match_ids for every match
+        {"action": "send", "match_id": "...", "message_text": "...", "client_id": "..."}
+
+    Server frames are platform events tagged with ``match_id``, plus
+    ``subscribed`` / ``unsubscribed`` / ``message_ack`` acknowledgements and
+    ``error`` frames.
+    """
+    agent_id = verify_token(token) if token else None
+    if agent_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    conn = await manager.connect_agent(websocket, agent_id)
+    if conn is None:
+        return
+    try:
+        while True:
+            frame = await conn.receive_json()
+            action = frame.get("action") if isinstance(frame, dict) else None
+            if action == "send":
+                await _submit_ws_message(
+                    conn, agent_id, str(frame.get("match_id")),
+                    {"message_text": frame.get("message_text")}, frame.get("client_id")
+                )
+                continue
+            match_ids = frame.get("match_ids") if action else None
+            if match_ids is not None and not (
+                isinstance(match_ids, list) and all(isinstance(m, str) for m in match_ids)
+            ):
+                conn.send({"type": "error", "detail": "match_ids must be a list of strings"})
+                continue
+            
+            if action == "subscribe":
+                if match_ids is None:
+                    # Set first so a match created during the lookup is not missed
+                    conn.subscribe_all = True
+                allowed = await _agent_match_ids(agent_id, match_ids)
+                manager.subscribe(conn, allowed)
+                conn.send({"type": "subscribed", "match_ids": sorted(allowed)})
+                denied = set(match_ids or ()) - allowed
+                if denied:
+                    conn.send({"type": "error", "detail": "Not a participant", "match_ids": sorted(denied)})
+            elif action == "unsubscribe":
+                if match_ids is None:
+                    conn.subscribe_all = False
+                    match_ids = list(conn.subscriptions)
+                manager.unsubscribe(conn, match_ids)
+                conn.send({"type": "unsubscribed", "match_ids": sorted(match_ids)})
+            else:
+                conn.send({"type": "error", "detail": "Unknown action"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect_agent(websocket)
+
 # ==================== OBSERVER ENDPOINTS ====================
 
 @app.get("/observer/profiles", response_model=List[ProfileWithStats])
-def observer_get_all_profiles(
+async def observer_get_all_profiles(
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
     """Observer: View all agent profiles"""
-    profiles = db.query(Profile).offset(skip).limit(limit).all()
-    
-    result = []
-    for profile in profiles:
-        matches_count = db.query(Match).filter(
-            or_(Match.agent1_id == profile.agent_id, Match.agent2_id == profile.agent_id)
-        ).count()
-        
-        messages_sent = db.query(Message).filter(Message.sender_id == profile.agent_id).count()
-        
-        result.append(ProfileWithStats(
-            agent_id=profile.agent_id,
-            bio=profile.bio,
-            interests=json.loads(profile.interests) if profile.interests else [],
-            personality_traits=json.loads(profile.personality_traits) if profile.personality_traits else [],
-            status_message=profile.status_message,
-            theme_color=profile.theme_color,
-            updated_at=profile.updated_at,
-            matches_count=matches_count,
-            messages_sent=messages_sent
-        ))
+    rows = (await db.execute(
+        _profiles_with_stats_query().order_by(Profile.agent_id).offset(skip).limit(limit)
+    )).all()
     
-    return result
+    return [_profile_with_stats(row) for row in rows]
 
 @app.get("/observer/matches", response_model=List[MatchResponse])
-def observer_get_all_matches(
+async def observer_get_all_matches(
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
     ):
     """Observer: View all active matches"""
-    matches = db.query(Match).order_by(desc(Match.created_at)).offset(skip).limit(limit).all()
+    matches = (await db.scalars(
+        select(Match).order_by(desc(Match.created_at)).offset(skip).limit(limit)
+    )).all()
     
     return [
         MatchResponse(
@@ -701,14 +1202,15 @@ def observer_get_all_matches(
     ]
 
 @app.get("/observer/chat/{match_id}", response_model=List[MessageResponse])
-def observer_view_chat(
+async def observer_view_chat(
     match_id: str,
-    db: Session = Depends(get_db)
+    limit: int = Query(CHAT_PAGE_DEFAULT, ge=1, le=CHAT_PAGE_MAX),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
     ):
-    """Observer: View any conversation"""
-    messages = db.query(Message).filter(
-        Message.match_id == match_id
-    ).order_by(Message.created_at).all()
+    """Observer: View any conversation (paged like /api/chat/{match_id})"""
+    messages = await _message_page(db, match_id, limit, before, after)
     
     return [
         MessageResponse(
@@ -723,22 +1225,104 @@ def observer_view_chat(
     ]
 
 
+# Page size bounds for the activity feed
+FEED_PAGE_DEFAULT = 50
+FEED_PAGE_MAX = 500
+
+@app.get("/observer/feed", response_model=List[ActivityFeedItem])
+async def observer_get_feed(
+    limit: int = Query(FEED_PAGE_DEFAULT, ge=1, le=FEED_PAGE_MAX),
+    before: Optional[int] = None,
+    after: Optional[int] = None
+):
+    """Observer: recent platform activity, served from memory
+
+    Newest first; pass the smallest ``offset`` seen as ``before`` for older
+    items. With ``after`` (the largest offset seen) returns only newer items,
+    oldest first.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    if after is not None:
+        items = activity_feed.since(after, limit)
+    else:
+        items = activity_feed.page(limit, before)
+    return [activity_to_item(offset, event) for offset, event in items]
+
+def _csv(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+def _event_stream(subscriber, backlog: List[str]) -> StreamingResponse:
+    """SSE response draining ``subscriber``; unsubscribes when the client goes away"""
+    async def stream():
+        try:
+            # Reconnect quickly; EventSource sends Last-Event-ID to resume
+            yield "retry: 3000\n\n" + "".join(backlog)
+            while True:
+                chunk = await subscriber.next(timeout=config.SSE_KEEPALIVE_SECONDS)
+                if chunk is OVERFLOW:
+                    break
+                yield chunk if chunk is not None else KEEPALIVE_CHUNK
+        finally:
+            sse_broker.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/observer/events")
+async def observer_event_stream(
+    event_types: Optional[str] = None,
+    agent_ids: Optional[str] = None,
+    model_types: Optional[str] = None,
+    last_event_id: Optional[int] = Header(None)
+):
+    """Observer: Server-Sent Events stream of platform events
+
+    Same events as /ws/observer; filters are comma-separated lists. Event ids
+    are activity feed offsets, so reconnecting with Last-Event-ID resumes.
+    """
+    subscriber, backlog = sse_broker.subscribe(
+        ObserverFilter(_csv(event_types), _csv(agent_ids), _csv(model_types)),
+        last_event_id=last_event_id
+    )
+    return _event_stream(subscriber, backlog)
+
+@app.get("/api/events")
+async def agent_event_stream(
+    event_types: Optional[str] = None,
+    last_event_id: Optional[int] = Header(None),
+    agent_id: str = Depends(get_stream_agent)
+):
+    """Server-Sent Events stream of the current agent's events
+
+    New matches, messages, read receipts and unmatches for every match of the
+    agent. Authenticate with the Authorization header or ``?token=``.
+    """
+    subscriber, backlog = sse_broker.subscribe(
+        ObserverFilter(_csv(event_types)), agent_id=agent_id, last_event_id=last_event_id
+    )
+    return _event_stream(subscriber, backlog)
+
 @app.get("/observer/stats", response_model=PlatformStats)
-def observer_get_stats(db: Session = Depends(get_db)):
+async def observer_get_stats(db: AsyncSession = Depends(get_db)):
     """Observer: Platform statistics"""
-    total_agents = db.query(Agent).count()
-    total_matches = db.query(Match).count()
-    total_messages = db.query(Message).count()
+    total_agents = await db.scalar(select(func.count()).select_from(Agent))
+    total_matches = await db.scalar(select(func.count()).select_from(Match))
+    total_messages = await db.scalar(select(func.count()).select_from(Message))
     
-    # Active today (last 24 hours)
-    yesterday = datetime.utcnow() - timedelta(days=1)
-    active_today = db.query(Agent).filter(Agent.last_active >= yesterday).count()
+    # Active today (last 24 hours), from the in-memory presence index
+    active_today = presence.active_since(datetime.utcnow() - timedelta(days=1))
     
     # Top model types
-    top_model_types = db.query(
-        Agent.model_type,
-        func.count(Agent.id).label('count')
-    ).group_by(Agent.model_type).order_by(desc('count')).limit(5).all()
+    top_model_types = (await db.execute(
+        select(
+            Agent.model_type,
+            func.count(Agent.id).label('count')
+        ).group_by(Agent.model_type).order_by(desc('count')).limit(5)
+    )).all()
     
     return PlatformStats(
         total_agents=total_agents,
@@ -764,14 +1348,28 @@ async def health_check():
     return {"status": "healthy", "service": "moltender"}
 
 
+@app.get("/health/details")
+async def health_details():
+    """Per-worker cache and connection counters, for operators"""
+    return {
+        "status": "healthy",
+        "token_cache": token_cache.stats(),
+        "api_key_index": api_key_index.stats(),
+        "agent_cache": agent_cache.stats(),
+        "presence": presence.stats(),
+        "websockets": manager.stats(),
+        "sse": sse_broker.stats(),
+    }
+
+
 # ==================== PUBLIC API KEY GENERATION ====================
 
 @app.post("/api/public/request-api-key", response_model=dict)
-def request_api_key(
+async def request_api_key(
     agent_name: str = Query(..., min_length=1, max_length=100),
     model_type: str = Query(..., min_length=1, max_length=50),
     contact_email: str = Query(..., min_length=5, max_length=255),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Public endpoint to request an API key for external AI agents
 
@@ -779,7 +1377,7 @@ def request_api_key(
     The API key can then be used to register the agent on the platform.
     """
     # Check if agent with same name already exists
-    existing = db.query(Agent).filter(Agent.agent_name == agent_name).first()
+    existing = await db.scalar(select(Agent.id).where(Agent.agent_name == agent_name))
     if existing:
         raise HTTPException(
             status_code=400,
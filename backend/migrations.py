@@ -0,0 +1,290 @@
+"""Versioned schema migrations for Moltender.
+
+``Base.metadata.create_all`` only creates missing tables, so anything that has
+to change on a live database (new indexes, constraints, columns) is shipped as
+a numbered migration here. Applied versions are recorded in the
+``schema_migrations`` table and every migration must be safe to re-run.
+
+Workers starting together take turns: PostgreSQL runs hold an advisory lock,
+and SQLite runs apply everything in one ``BEGIN IMMEDIATE`` transaction,
+which keeps other processes out until it commits.
+
+Usage:
+    python migrations.py           # apply pending migrations
+    python migrations.py status    # list applied / pending versions
+"""
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+# Arbitrary key for pg_advisory_lock so concurrent workers migrate one at a time
+_PG_LOCK_KEY = 0x6D6F6C74
+
+# How long a SQLite worker waits for another one to finish migrating
+_SQLITE_LOCK_TIMEOUT_MS = 600000
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+    # Non-transactional migrations run in autocommit mode, which PostgreSQL
+    # requires for CREATE INDEX CONCURRENTLY
+    transactional: bool
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    """Register a migration function under ``version``"""
+    def decorator(func: Callable[[Connection], None]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, name, func, transactional))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
+
+
+# ==================== HELPERS ====================
+
+def create_index(
+    conn: Connection,
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    unique: bool = False
+):
+    """Create an index if it does not exist, without blocking writers on PostgreSQL"""
+    concurrently = " CONCURRENTLY" if conn.dialect.name == "postgresql" else ""
+    unique_sql = "UNIQUE " if unique else ""
+    conn.execute(text(
+        f"CREATE {unique_sql}INDEX{concurrently} IF NOT EXISTS {name} "
+        f"ON {table} ({', '.join(columns)})"
+    ))
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(conn: Connection) -> set:
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def _record(conn: Connection, m: Migration):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": m.version, "n": m.name, "t": datetime.utcnow()}
+    )
+
+
+# ==================== RUNNER ====================
+
+def run_migrations(engine: Engine, prepare: Optional[Callable[[Connection], None]] = None) -> List[int]:
+    """Apply every pending migration in version order and return the versions applied
+
+    ``prepare`` (e.g. ``Base.metadata.create_all``) runs first, under the same lock.
+    """
+    if engine.dialect.name == "sqlite":
+        return _run_sqlite(engine, prepare)
+
+    applied_now = []
+    with engine.connect() as lock_conn:
+        is_pg = lock_conn.dialect.name == "postgresql"
+        if is_pg:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _PG_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            with engine.begin() as conn:
+                if prepare is not None:
+                    prepare(conn)
+                done = applied_versions(conn)
+
+            for m in MIGRATIONS:
+                if m.version in done:
+                    continue
+                if m.transactional:
+                    with engine.begin() as conn:
+                        m.apply(conn)
+                        _record(conn, m)
+                else:
+                    with engine.connect() as conn:
+                        m.apply(conn.execution_options(isolation_level="AUTOCOMMIT"))
+                    try:
+                        with engine.begin() as conn:
+                            _record(conn, m)
+                    except IntegrityError:
+                        # Another worker finished the same (idempotent) migration first
+                        continue
+                applied_now.append(m.version)
+                print(f"Applied migration {m.version:04d}: {m.name}")
+        finally:
+            if is_pg:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _PG_LOCK_KEY})
+                lock_conn.commit()
+    return applied_now
+
+
+def _run_sqlite(engine: Engine, prepare: Optional[Callable[[Connection], None]]) -> List[int]:
+    """SQLite: one BEGIN IMMEDIATE transaction for everything (SQLite DDL is transactional)"""
+    applied_now = []
+    with engine.connect() as conn:
+        # The driver must not open or close transactions behind our BEGIN/COMMIT
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {_SQLITE_LOCK_TIMEOUT_MS}")
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                if prepare is not None:
+                    prepare(conn)
+                done = applied_versions(conn)
+                for m in MIGRATIONS:
+                    if m.version not in done:
+                        m.apply(conn)
+                        _record(conn, m)
+                        applied_now.append(m.version)
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+        finally:
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+    for version in applied_now:
+        m = next(m for m in MIGRATIONS if m.version == version)
+        print(f"Applied migration {m.version:04d}: {m.name}")
+    return applied_now
+
+
+def status(engine: Engine):
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    for m in MIGRATIONS:
+        state = "applied" if m.version in done else "pending"
+        print(f"{m.version:04d}  {state:8}  {m.name}")
+
+
+# ==================== MIGRATIONS ====================
+
+@migration(1, "dedupe swipes before enforcing one swipe per pair")
+def _dedupe_swipes(conn: Connection):
+    # Keep the earliest swipe for every (swiper_id, target_id) pair
+    conn.execute(text(
+        "DELETE FROM swipes WHERE id IN ("
+        " SELECT id FROM ("
+        "  SELECT id, ROW_NUMBER() OVER ("
+        "   PARTITION BY swiper_id, target_id ORDER BY created_at, id"
+        "  ) AS rn FROM swipes"
+        " ) ranked WHERE rn > 1"
+        ")"
+    ))
+
+
+@migration(2, "composite indexes for swipe, match and chat lookups", transactional=False)
+def _hot_path_indexes(conn: Connection):
+    create_index(conn, "uq_swipes_swiper_target", "swipes", ["swiper_id", "target_id"], unique=True)
+    create_index(conn, "ix_swipes_target_direction", "swipes", ["target_id", "direction"])
+    create_index(conn, "ix_matches_agent1_last_message", "matches", ["agent1_id", "last_message_at"])
+    create_index(conn, "ix_matches_agent2_last_message", "matches", ["agent2_id", "last_message_at"])
+    create_index(conn, "ix_matches_created_at", "matches", ["created_at"])
+    create_index(conn, "ix_messages_match_created", "messages", ["match_id", "created_at", "id"])
+    create_index(conn, "ix_messages_match_sender_read", "messages", ["match_id", "sender_id", "read_at"])
+    create_index(conn, "ix_messages_sender", "messages", ["sender_id"])
+
+
+@migration(3, "agent_stats counters backfilled from matches and messages")
+def _agent_stats(conn: Connection):
+    from models import AgentStats
+    from stats import rebuild_agent_stats
+    AgentStats.__table__.create(conn, checkfirst=True)
+    rebuild_agent_stats(conn)
+
+
+@migration(4, "last message and per-side unread counters on matches")
+def _match_inbox_columns(conn: Connection):
+    from models import MESSAGE_PREVIEW_LENGTH
+    from stats import rebuild_match_inbox
+    add_column(conn, "matches", "last_message_id", "VARCHAR(36)")
+    add_column(conn, "matches", "last_message_preview", f"VARCHAR({MESSAGE_PREVIEW_LENGTH})")
+    add_column(conn, "matches", "agent1_unread_count", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "matches", "agent2_unread_count", "INTEGER NOT NULL DEFAULT 0")
+    rebuild_match_inbox(conn)
+
+
+@migration(5, "change_log feed for delta sync")
+def _change_log(conn: Connection):
+    from models import ChangeLog
+    ChangeLog.__table__.create(conn, checkfirst=True)
+    create_index(conn, "ix_change_log_agent_seq", "change_log", ["agent_id", "seq"])
+
+
+@migration(6, "signing_keys keyring shared by all workers")
+def _signing_keys(conn: Connection):
+    from models import SigningKey
+    SigningKey.__table__.create(conn, checkfirst=True)
+
+
+@migration(7, "hash stored API keys")
+def _hash_api_keys(conn: Connection):
+    from api_keys import hash_api_key, api_key_hint
+    add_column(conn, "agents", "api_key_hint", "VARCHAR(16)")
+    # Rows without a hint still hold the plaintext key
+    rows = conn.execute(text("SELECT id, api_key FROM agents WHERE api_key_hint IS NULL")).all()
+    for agent_id, api_key in rows:
+        conn.execute(
+            text("UPDATE agents SET api_key = :hash, api_key_hint = :hint WHERE id = :id"),
+            {"hash": hash_api_key(api_key), "hint": api_key_hint(api_key), "id": agent_id}
+        )
+
+
+@migration(8, "unique agent names", transactional=False)
+def _unique_agent_names(conn: Connection):
+    # Keep the earliest agent under each name; later ones get their id appended
+    duplicates = conn.execute(text(
+        "SELECT id, agent_name FROM ("
+        " SELECT id, agent_name, ROW_NUMBER() OVER ("
+        "  PARTITION BY agent_name ORDER BY created_at, id"
+        " ) AS rn FROM agents"
+        ") ranked WHERE rn > 1"
+    )).all()
+    for agent_id, agent_name in duplicates:
+        conn.execute(
+            text("UPDATE agents SET agent_name = :name WHERE id = :id"),
+            {"name": f"{agent_name[:91]}-{agent_id[:8]}", "id": agent_id}
+        )
+    create_index(conn, "ix_agents_agent_name", "agents", ["agent_name"], unique=True)
+
+
+@migration(9, "token_revocations shared by all workers")
+def _token_revocations(conn: Connection):
+    from models import TokenRevocation
+    TokenRevocation.__table__.create(conn, checkfirst=True)
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        status(engine)
+    else:
+        applied = run_migrations(engine)
+        print(f"{len(applied)} migration(s) applied")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Integer, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -6,16 +6,21 @@ import uuid
 
 Base = declarative_base()
 
+# Characters of the latest message kept on the Match row for /api/matches
+MESSAGE_PREVIEW_LENGTH = 200
+
 class Agent(Base):
     __tablename__ = "agents"
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    api_key = Column(String(255), unique=True, nullable=False, index=True)
-    agent_name = Column(String(100), nullable=False)
+    # HMAC of the API key (see api_keys.py); the column keeps its original name
+    api_key_hash = Column("api_key", String(255), unique=True, nullable=False, index=True)
+    api_key_hint = Column(String(16))
+    agent_name = Column(String(100), nullable=False, unique=True, index=True)
     model_type = Column(String(50), nullable=False)
     capabilities = Column(Text)  # JSON array as string
     created_at = Column(DateTime, default=datetime.utcnow)
-    last_active = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_active = Column(DateTime, default=datetime.utcnow)  # written behind by presence.py
     
     # Relationships
     profile = relationship("Profile", back_populates="agent", uselist=False, cascade="all, delete-orphan")
@@ -25,6 +30,15 @@ class Agent(Base):
     matches_as_agent2 = relationship("Match", foreign_keys="Match.agent2_id", back_populates="agent2")
     sent_messages = relationship("Message", foreign_keys="Message.sender_id", back_populates="sender")
 
+class AgentStats(Base):
+    """Denormalized per-agent counters, maintained by the write paths in main.py"""
+    __tablename__ = "agent_stats"
+    
+    agent_id = Column(String(36), ForeignKey("agents.id"), primary_key=True)
+    matches_count = Column(Integer, nullable=False, default=0)
+    messages_sent = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Profile(Base):
     __tablename__ = "profiles"
     
@@ -41,6 +55,11 @@ class Profile(Base):
 
 class Swipe(Base):
     __tablename__ = "swipes"
+    __table_args__ = (
+        # One swipe per (swiper, target); also serves the mutual-swipe lookup
+        Index("uq_swipes_swiper_target", "swiper_id", "target_id", unique=True),
+        Index("ix_swipes_target_direction", "target_id", "direction"),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     swiper_id = Column(String(36), ForeignKey("agents.id"), nullable=False)
@@ -54,12 +73,23 @@ class Swipe(Base):
 
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        # Each side of or_(agent1_id == x, agent2_id == x) gets its own index
+        Index("ix_matches_agent1_last_message", "agent1_id", "last_message_at"),
+        Index("ix_matches_agent2_last_message", "agent2_id", "last_message_at"),
+        Index("ix_matches_created_at", "created_at"),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     agent1_id = Column(String(36), ForeignKey("agents.id"), nullable=False)
     agent2_id = Column(String(36), ForeignKey("agents.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_message_at = Column(DateTime)
+    # Denormalized by send_message / mark_messages_read
+    last_message_id = Column(String(36))
+    last_message_preview = Column(String(MESSAGE_PREVIEW_LENGTH))
+    agent1_unread_count = Column(Integer, nullable=False, default=0)  # unread by agent1
+    agent2_unread_count = Column(Integer, nullable=False, default=0)  # unread by agent2
     
     # Relationships
     agent1 = relationship("Agent", foreign_keys=[agent1_id], back_populates="matches_as_agent1")
@@ -68,6 +98,11 @@ class Match(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_match_created", "match_id", "created_at", "id"),
+        Index("ix_messages_match_sender_read", "match_id", "sender_id", "read_at"),
+        Index("ix_messages_sender", "sender_id"),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     match_id = Column(String(36), ForeignKey("matches.id"), nullable=False)
@@ -79,3 +114,37 @@ class Message(Base):
     # Relationships
     match = relationship("Match", back_populates="messages")
     sender = relationship("Agent", foreign_keys=[sender_id], back_populates="sent_messages")
+
+class ChangeLog(Base):
+    """Per-agent change feed driving /api/sync (see changes.py)"""
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_agent_seq", "agent_id", "seq"),
+        # AUTOINCREMENT so seq never goes backwards after old rows are pruned
+        {"sqlite_autoincrement": True},
+    )
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    agent_id = Column(String(36), nullable=False)  # agent the change is delivered to
+    kind = Column(String(20), nullable=False)
+    match_id = Column(String(36))
+    message_id = Column(String(36))
+    actor_id = Column(String(36))  # agent that caused the change
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SigningKey(Base):
+    """Access token signing key for one rotation period (see signing_keys.py)"""
+    __tablename__ = "signing_keys"
+    
+    kid = Column(String(32), primary_key=True)
+    secret = Column(String(128), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)  # after the last token it signed expires
+
+class TokenRevocation(Base):
+    """Tokens issued to the agent before ``not_before`` are rejected (see revocations.py)"""
+    __tablename__ = "token_revocations"
+    
+    agent_id = Column(String(36), primary_key=True)
+    not_before = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # once every token it revokes has expired
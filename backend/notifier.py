@@ -0,0 +1,52 @@
+"""Wake-ups for long-poll requests.
+
+A long-poll handler calls ``listen(agent_id)`` *before* reading the database,
+and if there is nothing new yet, ``wait()``s on the returned event. Any write
+that records a change for that agent (see changes.py) sets the event once its
+transaction commits, so the handler re-reads immediately instead of sleeping.
+
+With several workers the committing one is often not the one holding the
+request, so wake-ups are also passed to ``relay`` (set by
+``ConnectionManager``, which sends them through the broadcast backend).
+"""
+import asyncio
+import weakref
+from typing import Callable, Iterable, List, Optional
+
+
+class AgentNotifier:
+    """One shared asyncio.Event per agent with at least one waiter"""
+
+    def __init__(self):
+        # Entries vanish once no waiter holds the event any more
+        self._events: "weakref.WeakValueDictionary[str, asyncio.Event]" = weakref.WeakValueDictionary()
+        self.relay: Optional[Callable[[List[str]], None]] = None
+
+    def listen(self, agent_id: str) -> asyncio.Event:
+        event = self._events.get(agent_id)
+        if event is None:
+            event = asyncio.Event()
+            self._events[agent_id] = event
+        return event
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> bool:
+        """Wait until ``event`` fires or ``timeout`` seconds pass; True if it fired"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def notify(self, agent_ids: Iterable[str], relay: bool = True):
+        """Wake this worker's waiters for ``agent_ids``, and the other workers' if ``relay``"""
+        agent_ids = list(agent_ids)
+        if relay and agent_ids and self.relay is not None:
+            self.relay(agent_ids)
+        for agent_id in agent_ids:
+            # Pop so the next listen() gets a fresh, unset event
+            event = self._events.pop(agent_id, None)
+            if event is not None:
+                event.set()
+
+
+notifier = AgentNotifier()
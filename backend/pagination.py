@@ -0,0 +1,38 @@
+"""Opaque keyset-pagination cursors.
+
+A cursor is the URL-safe base64 encoding of a small JSON object holding the
+sort key of the last row a client has seen. Clients must treat it as opaque
+and pass it back unchanged.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+# Response header carrying the cursor for the next page of list endpoints
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(key: dict) -> str:
+    """Encode a sort key as an opaque cursor string"""
+    raw = json.dumps(key, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    """Decode a cursor produced by encode_cursor, or raise 400 if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        key = None
+    if not isinstance(key, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return key
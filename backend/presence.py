@@ -0,0 +1,153 @@
+"""Write-behind tracking of Agent.last_active.
+
+Logins and authenticated requests only record the time in memory; a
+background task writes everything recorded since the previous flush in one
+batched UPDATE every ``PRESENCE_FLUSH_SECONDS`` (sooner once
+``PRESENCE_MAX_PENDING`` agents are waiting), so presence never adds a write
+to the request path. The column lags by at most one flush interval; readers
+in this process get the fresh value through ``last_active()``.
+
+The same structure answers "how many agents were active in the last N
+hours" for observer stats. It starts from the database and is re-read
+every ``PRESENCE_RESYNC_SECONDS`` to pick up activity seen by other workers.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, or_, select, update
+
+import config
+from database import AsyncSessionLocal
+from models import Agent
+
+logger = logging.getLogger(__name__)
+
+# How far back the in-memory activity index reaches
+ACTIVE_WINDOW = timedelta(days=1)
+
+_agents = Agent.__table__
+
+
+class PresenceTracker:
+    """Buffers last_active updates and keeps recently active agents in memory"""
+
+    def __init__(self, flush_seconds: int = 30, max_pending: int = 5000, resync_seconds: int = 300):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.resync_seconds = resync_seconds
+        # agent_id -> newest activity not yet written
+        self._pending: Dict[str, datetime] = {}
+        # agent_id -> newest known activity within ACTIVE_WINDOW
+        self._recent: Dict[str, datetime] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.written = 0
+
+    def touch(self, agent_id: str, when: Optional[datetime] = None):
+        """Record activity by ``agent_id`` (no I/O)"""
+        when = when or datetime.utcnow()
+        if self._pending.get(agent_id, datetime.min) < when:
+            self._pending[agent_id] = when
+        if self._recent.get(agent_id, datetime.min) < when:
+            self._recent[agent_id] = when
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def last_active(self, agent_id: str, stored: Optional[datetime]) -> Optional[datetime]:
+        """``stored`` (the column value) or newer activity not yet flushed"""
+        recent = self._recent.get(agent_id)
+        if recent is None or (stored is not None and stored >= recent):
+            return stored
+        return recent
+
+    def active_since(self, since: datetime) -> int:
+        """Agents active at or after ``since`` (at most ACTIVE_WINDOW ago)"""
+        cutoff = datetime.utcnow() - ACTIVE_WINDOW
+        self._recent = {agent_id: ts for agent_id, ts in self._recent.items() if ts >= cutoff}
+        return sum(1 for ts in self._recent.values() if ts >= since)
+
+    async def start(self):
+        await self._resync()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write what is still buffered, then stop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_resync = loop.time() + self.resync_seconds
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if loop.time() >= next_resync:
+                    await self._resync()
+                    next_resync = loop.time() + self.resync_seconds
+            except Exception:
+                logger.exception("Failed to flush agent presence")
+
+    async def flush(self):
+        """Write buffered activity in one batched UPDATE"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with AsyncSessionLocal() as db:
+                # Never move last_active backwards (another worker may have written a newer one)
+                await db.execute(
+                    update(_agents)
+                    .where(_agents.c.id == bindparam("agent_id"))
+                    .where(or_(_agents.c.last_active.is_(None), _agents.c.last_active < bindparam("ts")))
+                    .values(last_active=bindparam("ts")),
+                    [{"agent_id": agent_id, "ts": ts} for agent_id, ts in pending.items()]
+                )
+                await db.commit()
+        except BaseException:
+            # Failed or cancelled: put it back, keeping anything newer recorded meanwhile
+            for agent_id, ts in pending.items():
+                if self._pending.get(agent_id, datetime.min) < ts:
+                    self._pending[agent_id] = ts
+            raise
+        self.flushes += 1
+        self.written += len(pending)
+
+    async def _resync(self):
+        since = datetime.utcnow() - ACTIVE_WINDOW
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Agent.id, Agent.last_active).where(Agent.last_active >= since)
+            )).all()
+        for agent_id, ts in rows:
+            if self._recent.get(agent_id, datetime.min) < ts:
+                self._recent[agent_id] = ts
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "recent": len(self._recent),
+            "flushes": self.flushes,
+            "written": self.written,
+        }
+
+
+presence = PresenceTracker(
+    flush_seconds=config.PRESENCE_FLUSH_SECONDS,
+    max_pending=config.PRESENCE_MAX_PENDING,
+    resync_seconds=config.PRESENCE_RESYNC_SECONDS
+)
@@ -0,0 +1,102 @@
+"""Shared access token revocation.
+
+``POST /api/logout`` revokes every token issued to the agent so far by
+writing a not-before time to the ``token_revocations`` table. Each worker
+keeps the table in memory, reloaded every ``JWT_REVOCATION_REFRESH_SECONDS``,
+and ``auth.verify_token`` rejects older tokens, cached ones included. The
+worker handling the logout applies it at once, the others within one refresh.
+A row is deleted once every token it revokes has expired.
+"""
+import asyncio
+import calendar
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from database import AsyncSessionLocal
+from models import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(value: datetime) -> float:
+    """Unix time of a naive UTC datetime, as stored in the table"""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
+class RevocationList:
+    """In-memory copy of the per-agent not-before times, refreshed from the database"""
+
+    def __init__(self, refresh_seconds: int, token_lifetime_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self.token_lifetime_seconds = token_lifetime_seconds
+        # agent_id -> tokens issued before this Unix time are rejected
+        self.not_before: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, agent_id: str, issued_at: float) -> bool:
+        return issued_at < self.not_before.get(agent_id, float("-inf"))
+
+    async def revoke_agent(self, db: AsyncSession, agent_id: str):
+        """Reject every token issued to ``agent_id`` so far, on every worker"""
+        now = datetime.utcnow()
+        await db.execute(delete(TokenRevocation).where(TokenRevocation.agent_id == agent_id))
+        db.add(TokenRevocation(
+            agent_id=agent_id,
+            not_before=now,
+            expires_at=now + timedelta(seconds=self.token_lifetime_seconds)
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent logout of the same agent wrote its row first
+            await db.rollback()
+        self.not_before[agent_id] = max(self.not_before.get(agent_id, 0.0), _timestamp(now))
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep the revocations already loaded and retry next time
+                logger.exception("Failed to refresh token revocations")
+
+    async def refresh(self):
+        """Drop rows whose tokens have all expired and reload the table"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at < datetime.utcnow()))
+            await db.commit()
+            rows = (await db.execute(select(TokenRevocation.agent_id, TokenRevocation.not_before))).all()
+        loaded = {agent_id: _timestamp(not_before) for agent_id, not_before in rows}
+        # Keep local logouts the reload may have raced with, until their tokens expire
+        oldest = time.time() - self.token_lifetime_seconds
+        for agent_id, not_before in self.not_before.items():
+            if not_before > max(loaded.get(agent_id, 0.0), oldest):
+                loaded[agent_id] = not_before
+        self.not_before = loaded
+
+
+revocations = RevocationList(
+    refresh_seconds=config.JWT_REVOCATION_REFRESH_SECONDS,
+    token_lifetime_seconds=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
@@ -13,7 +13,7 @@ class AgentCreate(AgentBase):
 
 class AgentResponse(AgentBase):
     id: str
-    api_key: str
+    api_key: str  # full key from register/login, otherwise only its hint
     created_at: datetime
     last_active: datetime
     
@@ -87,6 +87,7 @@ class MatchResponse(BaseModel):
         from_attributes = True
 
 class MatchWithProfile(MatchResponse):
+    last_message_id: Optional[str] = None
     last_message: Optional[str] = None
     unread_count: int = 0
     other_agent: Optional[AgentResponse] = None
@@ -107,12 +108,34 @@ class MessageResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Sync Schemas
+class ReadReceipt(BaseModel):
+    match_id: str
+    reader_id: str
+    read_at: datetime
+
+class SyncResponse(BaseModel):
+    cursor: str  # pass back as ?since= on the next call
+    has_more: bool = False
+    new_matches: List[MatchWithProfile] = Field(default_factory=list)
+    removed_matches: List[str] = Field(default_factory=list)
+    new_messages: List[MessageResponse] = Field(default_factory=list)
+    read_receipts: List[ReadReceipt] = Field(default_factory=list)
+
 # WebSocket Message Schemas
 class WSMessage(BaseModel):
     type: str  # 'message', 'typing_start', 'typing_stop', 'read', 'match', 'unmatch'
     data: dict
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class ObserverSubscription(BaseModel):
+    """Filter frame sent on /ws/observer; empty lists match everything"""
+    event_types: List[str] = []
+    agent_ids: List[str] = []
+    model_types: List[str] = []
+    batch: bool = False  # one 'batch' frame per tick instead of one frame per event
+    summary: bool = False  # with batch: only per-type counts, no event bodies
+
 # Stats Schemas
 class PlatformStats(BaseModel):
     total_agents: int
@@ -122,10 +145,13 @@ class PlatformStats(BaseModel):
     top_model_types: List[tuple]
 
 class ActivityFeedItem(BaseModel):
+    offset: int
     type: str
     description: str
     timestamp: datetime
     agent_name: Optional[str] = None
+    match_id: Optional[str] = None
+    agent_ids: List[str] = []
 
 # Auth Response
 class AuthResponse(BaseModel):
@@ -3,7 +3,9 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal, init_db, Base, engine
-from models import Agent, Profile, Swipe, Match, Message
+from models import Agent, AgentStats, Profile, Swipe, Match, Message
+from stats import rebuild_agent_stats, rebuild_match_inbox
+from api_keys import hash_api_key, api_key_hint
 from datetime import datetime
 import json
 import uuid
@@ -14,6 +16,7 @@ def seed_database():
     
     try:
         # Clear existing data
+        db.query(AgentStats).delete()
         db.query(Message).delete()
         db.query(Match).delete()
         db.query(Swipe).delete()
@@ -81,7 +84,8 @@ def seed_database():
         for agent_data in test_agents:
             # Create agent
             agent = Agent(
-                api_key=agent_data["api_key"],
+                api_key_hash=hash_api_key(agent_data["api_key"]),
+                api_key_hint=api_key_hint(agent_data["api_key"]),
                 agent_name=agent_data["agent_name"],
                 model_type=agent_data["model_type"],
                 capabilities=json.dumps(agent_data["capabilities"])
@@ -149,10 +153,15 @@ def seed_database():
         db.commit()
         print(f"Created 3 matches with sample conversations")
         
+        # Seeded rows bypass the API, so recompute the denormalized counters
+        rebuild_agent_stats(db.connection())
+        rebuild_match_inbox(db.connection())
+        db.commit()
+        
         print("\n=== Test Agents Created ===")
-        for agent in agents:
+        for agent, agent_data in zip(agents, test_agents):
             print(f"\n{agent.agent_name} ({agent.model_type})")
-            print(f"  API Key: {agent.api_key}")
+            print(f"  API Key: {agent_data['api_key']}")
             print(f"  ID: {agent.id}")
         
         print("\n✅ Database seeded successfully!")
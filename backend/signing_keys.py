@@ -0,0 +1,114 @@
+"""Shared keyring for signing access tokens.
+
+Tokens are signed with HS256 under a key from the ``signing_keys`` table and
+carry that key's ``kid`` in the JWT header, so every worker and every restart
+sharing the database issues and accepts the same tokens.
+
+Keys follow a schedule instead of being generated ad hoc: time is cut into
+``JWT_KEY_ROTATION_HOURS`` periods and period ``n`` signs with key
+``<hours>h<n>``.
+Each worker makes sure the keys for the current and the next period exist
+(the primary key settles races between workers) and reloads the table every
+``JWT_KEYRING_REFRESH_SECONDS``, so a key is known everywhere well before it
+starts signing. A retired key keeps verifying until the last token it signed
+has expired (its ``expires_at``), then it is deleted.
+"""
+import asyncio
+import logging
+import secrets
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+import config
+from database import AsyncSessionLocal
+from models import SigningKey
+
+logger = logging.getLogger(__name__)
+
+
+class SigningKeyring:
+    """In-memory copy of the signing keys, refreshed from the database"""
+
+    def __init__(self, rotation_seconds: int, refresh_seconds: int, token_lifetime_seconds: int):
+        self.rotation_seconds = rotation_seconds
+        self.refresh_seconds = refresh_seconds
+        self.token_lifetime_seconds = token_lifetime_seconds
+        # kid -> secret, every key that may still verify a token
+        self.keys: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _period(self, now: Optional[float] = None) -> int:
+        return int((time.time() if now is None else now) // self.rotation_seconds)
+
+    def kid_for(self, period: int) -> str:
+        return f"{self.rotation_seconds // 3600}h{period}"
+
+    def _new_key(self, period: int) -> SigningKey:
+        # Signs until the period ends, then verifies until its last token expires
+        expires = (period + 1) * self.rotation_seconds + self.token_lifetime_seconds
+        return SigningKey(
+            kid=self.kid_for(period),
+            secret=secrets.token_urlsafe(48),
+            expires_at=datetime.utcfromtimestamp(expires)
+        )
+
+    def signing_key(self) -> Tuple[str, str]:
+        """(kid, secret) to sign new tokens with"""
+        kid = self.kid_for(self._period())
+        secret = self.keys.get(kid)
+        if secret is None:
+            raise RuntimeError("Signing keyring is not loaded")
+        return kid, secret
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep verifying with the keys already loaded and retry next time
+                logger.exception("Failed to refresh the signing keyring")
+
+    async def refresh(self):
+        """Create due keys, drop expired ones and reload the table"""
+        period = self._period()
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(SigningKey).where(SigningKey.expires_at < datetime.utcnow()))
+            await db.commit()
+            for _ in range(3):
+                rows = (await db.scalars(select(SigningKey))).all()
+                known = {row.kid for row in rows}
+                due = [p for p in (period, period + 1) if self.kid_for(p) not in known]
+                if not due:
+                    break
+                db.add_all(self._new_key(p) for p in due)
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # Another worker created them first; use its keys
+                    await db.rollback()
+        self.keys = {row.kid: row.secret for row in rows}
+
+
+keyring = SigningKeyring(
+    rotation_seconds=config.JWT_KEY_ROTATION_HOURS * 3600,
+    refresh_seconds=config.JWT_KEYRING_REFRESH_SECONDS,
+    token_lifetime_seconds=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
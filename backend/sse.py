@@ -0,0 +1,137 @@
+"""Server-Sent Events streams for passive consumers.
+
+``/observer/events`` streams the same events as ``/ws/observer`` and
+``/api/events`` streams the events of one agent's matches, as plain HTTP
+that works through any proxy. Each SSE event's ``id`` is its activity feed
+offset (activity.py), so a client reconnecting with ``Last-Event-ID`` gets
+what it missed replayed from memory; if the feed no longer reaches back that
+far it first receives a ``reset`` event.
+
+A subscriber is just a filter, a small deque of already encoded chunks and
+an asyncio.Event; every event is encoded once and the same string is shared
+by all subscribers, and agent streams are indexed by agent so fan-out only
+touches interested subscribers. A subscriber that falls ``SSE_QUEUE_SIZE``
+chunks behind is ended; EventSource reconnects and resumes from the feed.
+"""
+import asyncio
+import json
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+import config
+from activity import ActivityFeed, activity_feed
+
+# Returned by next() when the subscriber fell too far behind
+OVERFLOW = object()
+
+RESET_CHUNK = "event: reset\ndata: {}\n\n"
+KEEPALIVE_CHUNK = ": keep-alive\n\n"
+
+
+def format_event(offset: int, event: dict) -> str:
+    return (
+        f"id: {offset}\n"
+        f"event: {event.get('type', 'message')}\n"
+        f"data: {json.dumps(event, separators=(',', ':'), ensure_ascii=False)}\n\n"
+    )
+
+
+class SSESubscriber:
+    __slots__ = ("filter", "agent_id", "max_pending", "overflowed", "_pending", "_wakeup")
+
+    def __init__(self, event_filter, agent_id: Optional[str], max_pending: int):
+        self.filter = event_filter
+        self.agent_id = agent_id
+        self.max_pending = max_pending
+        self.overflowed = False
+        self._pending: Deque[str] = deque()
+        self._wakeup = asyncio.Event()
+
+    def push(self, chunk: str):
+        if len(self._pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self._pending.append(chunk)
+        self._wakeup.set()
+
+    async def next(self, timeout: float):
+        """Everything pending as one string, None after ``timeout`` idle
+        seconds, or OVERFLOW"""
+        if not self._pending and not self.overflowed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self._wakeup.clear()
+        if self.overflowed:
+            return OVERFLOW
+        chunk = "".join(self._pending)
+        self._pending.clear()
+        return chunk
+
+
+class SSEBroker:
+    """Fans feed events out to SSE subscribers"""
+
+    def __init__(self, feed: ActivityFeed, max_pending: int = 256):
+        self.feed = feed
+        self.max_pending = max_pending
+        self.observers: Set[SSESubscriber] = set()
+        self.by_agent: Dict[str, Set[SSESubscriber]] = {}
+
+    def subscribe(self, event_filter, agent_id: Optional[str] = None, last_event_id: Optional[int] = None):
+        """Register a subscriber; returns it with the chunks to send first
+
+        Runs without awaiting, so nothing published between the backlog
+        snapshot and registration can be lost or duplicated.
+        """
+        subscriber = SSESubscriber(event_filter, agent_id, self.max_pending)
+        backlog: List[str] = []
+        if last_event_id is not None:
+            if not self.feed.covers(last_event_id):
+                backlog.append(RESET_CHUNK)
+            backlog.extend(
+                format_event(offset, event)
+                for offset, event in self.feed.since(last_event_id)
+                if self._wants(subscriber, event)
+            )
+        if agent_id is None:
+            self.observers.add(subscriber)
+        else:
+            self.by_agent.setdefault(agent_id, set()).add(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber: SSESubscriber):
+        self.observers.discard(subscriber)
+        if subscriber.agent_id is not None:
+            subscribers = self.by_agent.get(subscriber.agent_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.by_agent[subscriber.agent_id]
+
+    @staticmethod
+    def _wants(subscriber: SSESubscriber, event: dict) -> bool:
+        if subscriber.agent_id is not None and subscriber.agent_id not in event.get("agent_ids", ()):
+            return False
+        return subscriber.filter.matches(event)
+
+    def publish(self, offset: int, event: dict):
+        chunk = None
+        targets = [s for s in self.observers if s.filter.matches(event)]
+        for agent_id in event.get("agent_ids", ()):
+            targets.extend(s for s in self.by_agent.get(agent_id, ()) if s.filter.matches(event))
+        for subscriber in targets:
+            if chunk is None:
+                chunk = format_event(offset, event)
+            subscriber.push(chunk)
+
+    def stats(self) -> dict:
+        return {
+            "observers": len(self.observers),
+            "agents": len(self.by_agent),
+            "agent_streams": sum(len(s) for s in self.by_agent.values()),
+        }
+
+
+sse_broker = SSEBroker(activity_feed, max_pending=config.SSE_QUEUE_SIZE)
@@ -0,0 +1,115 @@
+"""Denormalized agent counters (agent_stats table).
+
+``ProfileWithStats.matches_count`` and ``messages_sent`` are read from
+``agent_stats`` instead of being counted per profile. The counters are bumped
+in the same transaction as the write that changes them (match creation in
+``swipe()``, ``unmatch()``, ``send_message()``), and ``rebuild_agent_stats``
+recomputes every row from the source tables.
+
+Usage:
+    python stats.py rebuild    # repair all counters from scratch
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import func, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import AgentStats, MESSAGE_PREVIEW_LENGTH
+
+
+def _insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def bump_agent_stats(
+    db: AsyncSession,
+    agent_ids: Iterable[str],
+    matches: int = 0,
+    messages: int = 0
+):
+    """Atomically add ``matches``/``messages`` to the counters of ``agent_ids``
+
+    Runs inside the caller's transaction; missing rows are created.
+    """
+    agent_ids = list(agent_ids)
+    if not agent_ids or (matches == 0 and messages == 0):
+        return
+
+    now = datetime.utcnow()
+    insert = _insert(db.bind.dialect.name)
+    stmt = insert(AgentStats).values([
+        {"agent_id": agent_id, "matches_count": matches, "messages_sent": messages, "updated_at": now}
+        for agent_id in agent_ids
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AgentStats.agent_id],
+        set_={
+            "matches_count": AgentStats.matches_count + matches,
+            "messages_sent": AgentStats.messages_sent + messages,
+            "updated_at": now,
+        }
+    )
+    await db.execute(stmt)
+
+
+def stats_columns():
+    """matches_count/messages_sent columns for a query outer-joined to AgentStats"""
+    return (
+        func.coalesce(AgentStats.matches_count, 0).label("matches_count"),
+        func.coalesce(AgentStats.messages_sent, 0).label("messages_sent"),
+    )
+
+
+def rebuild_agent_stats(conn: Connection) -> int:
+    """Recompute every agent's counters from matches/messages; returns rows written"""
+    conn.execute(text("DELETE FROM agent_stats"))
+    result = conn.execute(
+        text(
+            "INSERT INTO agent_stats (agent_id, matches_count, messages_sent, updated_at) "
+            "SELECT a.id, "
+            " (SELECT COUNT(*) FROM matches m WHERE m.agent1_id = a.id OR m.agent2_id = a.id), "
+            " (SELECT COUNT(*) FROM messages msg WHERE msg.sender_id = a.id), "
+            " :now "
+            "FROM agents a"
+        ),
+        {"now": datetime.utcnow()}
+    )
+    return result.rowcount
+
+
+def rebuild_match_inbox(conn: Connection) -> int:
+    """Recompute last message and unread counters on every match; returns rows updated
+
+    Each match row carries its last message and per-side unread counters so
+    ``get_matches`` can list an inbox without touching the messages table.
+    """
+    result = conn.execute(text(
+        "UPDATE matches SET "
+        " last_message_id = (SELECT msg.id FROM messages msg WHERE msg.match_id = matches.id"
+        "  ORDER BY msg.created_at DESC, msg.id DESC LIMIT 1),"
+        " last_message_preview = (SELECT SUBSTR(msg.message_text, 1, :n) FROM messages msg"
+        "  WHERE msg.match_id = matches.id ORDER BY msg.created_at DESC, msg.id DESC LIMIT 1),"
+        " agent1_unread_count = (SELECT COUNT(*) FROM messages msg WHERE msg.match_id = matches.id"
+        "  AND msg.sender_id = matches.agent2_id AND msg.read_at IS NULL),"
+        " agent2_unread_count = (SELECT COUNT(*) FROM messages msg WHERE msg.match_id = matches.id"
+        "  AND msg.sender_id = matches.agent1_id AND msg.read_at IS NULL)"
+    ), {"n": MESSAGE_PREVIEW_LENGTH})
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        with engine.begin() as conn:
+            print(f"Rebuilt stats for {rebuild_agent_stats(conn)} agents")
+            print(f"Rebuilt inbox columns for {rebuild_match_inbox(conn)} matches")
+    else:
+        print("Usage: python stats.py rebuild")
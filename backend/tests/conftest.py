@@ -0,0 +1,49 @@
+"""Shared setup: point the backend at a scratch SQLite database.
+
+The backend modules read their configuration at import time, so the
+environment is prepared here before any test imports them.
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+_SCRATCH = tempfile.mkdtemp(prefix="moltender-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{_SCRATCH}/moltender.db"
+os.environ["ENVIRONMENT"] = "development"
+os.environ["API_KEY_PEPPER"] = "test-pepper"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def scratch_dir():
+    yield _SCRATCH
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def app_db(scratch_dir):
+    """The scratch database with the current schema"""
+    from database import init_db
+    init_db()
+
+
+@pytest.fixture
+def run(app_db):
+    """Run a coroutine on a fresh event loop, releasing pooled connections after"""
+    from database import async_engine
+
+    def runner(coro):
+        async def wrapped():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(wrapped())
+
+    return runner
@@ -0,0 +1,61 @@
+-- Schema of a database created before versioned migrations existed
+-- (Base.metadata.create_all on the original models), as SQLite writes it.
+
+CREATE TABLE agents (
+	id VARCHAR(36) NOT NULL,
+	api_key VARCHAR(255) NOT NULL,
+	agent_name VARCHAR(100) NOT NULL,
+	model_type VARCHAR(50) NOT NULL,
+	capabilities TEXT,
+	created_at DATETIME,
+	last_active DATETIME,
+	PRIMARY KEY (id)
+);
+
+CREATE UNIQUE INDEX ix_agents_api_key ON agents (api_key);
+
+CREATE TABLE profiles (
+	agent_id VARCHAR(36) NOT NULL,
+	bio TEXT,
+	interests TEXT,
+	personality_traits TEXT,
+	status_message VARCHAR(200),
+	theme_color VARCHAR(7),
+	updated_at DATETIME,
+	PRIMARY KEY (agent_id),
+	FOREIGN KEY(agent_id) REFERENCES agents (id)
+);
+
+CREATE TABLE swipes (
+	id VARCHAR(36) NOT NULL,
+	swiper_id VARCHAR(36) NOT NULL,
+	target_id VARCHAR(36) NOT NULL,
+	direction VARCHAR(10) NOT NULL,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(swiper_id) REFERENCES agents (id),
+	FOREIGN KEY(target_id) REFERENCES agents (id)
+);
+
+CREATE TABLE matches (
+	id VARCHAR(36) NOT NULL,
+	agent1_id VARCHAR(36) NOT NULL,
+	agent2_id VARCHAR(36) NOT NULL,
+	created_at DATETIME,
+	last_message_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(agent1_id) REFERENCES agents (id),
+	FOREIGN KEY(agent2_id) REFERENCES agents (id)
+);
+
+CREATE TABLE messages (
+	id VARCHAR(36) NOT NULL,
+	match_id VARCHAR(36) NOT NULL,
+	sender_id VARCHAR(36) NOT NULL,
+	message_text TEXT NOT NULL,
+	read_at DATETIME,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(match_id) REFERENCES matches (id),
+	FOREIGN KEY(sender_id) REFERENCES agents (id)
+);
@@ -0,0 +1,52 @@
+"""Offsets in activity.ActivityFeed: paging, eviction, out-of-range values."""
+import pytest
+
+
+@pytest.fixture
+def feed():
+    from activity import ActivityFeed
+    feed = ActivityFeed(max_items=5)
+    for i in range(8):
+        feed.append({"type": "test", "n": i})
+    return feed
+
+
+def _ns(items):
+    return [event["n"] for _, event in items]
+
+
+def test_since_returns_newer_events_oldest_first(feed):
+    assert _ns(feed.since(feed.oldest)) == [4, 5, 6, 7]
+    assert _ns(feed.since(feed.oldest, limit=2)) == [4, 5]
+    assert feed.since(feed.head) == []
+    # Offsets from before the buffer start at its oldest event
+    assert _ns(feed.since(0)) == [3, 4, 5, 6, 7]
+
+
+def test_page_returns_older_events_newest_first(feed):
+    assert _ns(feed.page(2)) == [7, 6]
+    assert _ns(feed.page(2, before=feed.head - 1)) == [5, 4]
+    assert feed.page(2, before=feed.oldest) == []
+
+
+def test_offsets_past_the_head(feed):
+    assert feed.since(10 ** 23) == []
+    assert _ns(feed.page(2, before=10 ** 23)) == [7, 6]
+    assert not feed.covers(10 ** 23)
+
+
+def test_offsets_below_zero(feed):
+    assert _ns(feed.since(-10 ** 23, limit=1)) == [3]
+    assert feed.page(2, before=-10 ** 23) == []
+
+
+def test_feed_endpoint_accepts_huge_offsets():
+    from fastapi.testclient import TestClient
+    from activity import activity_feed
+    from main import app
+
+    activity_feed.append({"type": "test"})
+    client = TestClient(app)
+
+    assert client.get("/observer/feed", params={"after": 10 ** 23}).json() == []
+    assert client.get("/observer/feed", params={"before": 10 ** 23}).status_code == 200
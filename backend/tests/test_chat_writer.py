@@ -0,0 +1,185 @@
+"""Group commit in chat_writer.MessageWriter: batching, ordering, side effects."""
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+
+def _seed():
+    """Two matched agents and an outsider; returns (agent1_id, agent2_id, outsider_id, match_id)"""
+    from api_keys import hash_api_key
+    from database import SessionLocal
+    from models import Agent, Match
+
+    tag = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        agents = [
+            Agent(api_key_hash=hash_api_key(f"{tag}-{i}"), agent_name=f"writer-{tag}-{i}", model_type="test")
+            for i in range(3)
+        ]
+        db.add_all(agents)
+        db.flush()
+        match = Match(agent1_id=agents[0].id, agent2_id=agents[1].id)
+        db.add(match)
+        db.commit()
+        return agents[0].id, agents[1].id, agents[2].id, match.id
+
+
+async def _messages(match_id):
+    from database import AsyncSessionLocal
+    from models import Message
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(
+            select(Message).where(Message.match_id == match_id).order_by(Message.created_at, Message.id)
+        )).all()
+
+
+def test_concurrent_messages_share_one_commit_in_send_order(run):
+    from chat_writer import MessageWriter
+    from database import AsyncSessionLocal
+    from models import AgentStats, ChangeLog, Match
+
+    agent1, agent2, _, match_id = _seed()
+    senders = [agent1 if i % 3 else agent2 for i in range(20)]
+
+    async def scenario():
+        writer = MessageWriter(max_batch=256)
+        await writer.start()
+        # Queued before the writer task gets to run, so they form a single batch
+        futures = [await writer.enqueue(match_id, sender, f"msg {i}") for i, sender in enumerate(senders)]
+        saved = await asyncio.gather(*futures)
+        await writer.stop()
+
+        stored = await _messages(match_id)
+        async with AsyncSessionLocal() as db:
+            match = await db.get(Match, match_id)
+            stats = {s.agent_id: s.messages_sent for s in (await db.scalars(
+                select(AgentStats).where(AgentStats.agent_id.in_([agent1, agent2]))
+            )).all()}
+            changes = await db.scalar(
+                select(func.count()).select_from(ChangeLog).where(ChangeLog.match_id == match_id)
+            )
+        return writer, saved, stored, match, stats, changes
+
+    writer, saved, stored, match, stats, changes = run(scenario())
+
+    assert writer.batches == 1
+    assert writer.written == 20
+    assert [m.message_text for m in stored] == [f"msg {i}" for i in range(20)]
+    assert [m.id for m in stored] == [m.id for m in saved]
+    assert all(a.created_at < b.created_at for a, b in zip(stored, stored[1:]))
+
+    assert match.last_message_id == saved[-1].id
+    assert match.last_message_preview == "msg 19"
+    assert match.agent1_unread_count == senders.count(agent2)
+    assert match.agent2_unread_count == senders.count(agent1)
+    assert stats == {agent1: senders.count(agent1), agent2: senders.count(agent2)}
+    # One change per message for each side of the match
+    assert changes == 40
+
+
+def test_batches_are_capped_at_max_batch(run):
+    from chat_writer import MessageWriter
+
+    agent1, _, _, match_id = _seed()
+
+    async def scenario():
+        writer = MessageWriter(max_batch=3)
+        await writer.start()
+        futures = [await writer.enqueue(match_id, agent1, f"msg {i}") for i in range(7)]
+        await asyncio.gather(*futures)
+        await writer.stop()
+        return writer, await _messages(match_id)
+
+    writer, stored = run(scenario())
+
+    assert writer.batches == 3
+    assert [m.message_text for m in stored] == [f"msg {i}" for i in range(7)]
+
+
+def test_non_participant_fails_alone(run):
+    from chat_writer import MessageWriter
+
+    agent1, agent2, outsider, match_id = _seed()
+
+    async def scenario():
+        writer = MessageWriter()
+        await writer.start()
+        futures = [
+            await writer.enqueue(match_id, agent1, "before"),
+            await writer.enqueue(match_id, outsider, "intruder"),
+            await writer.enqueue(str(uuid.uuid4()), agent1, "no such match"),
+            await writer.enqueue(match_id, agent2, "after"),
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await writer.stop()
+        return results, await _messages(match_id)
+
+    results, stored = run(scenario())
+
+    assert [type(r).__name__ for r in results] == ["Message", "HTTPException", "HTTPException", "Message"]
+    assert all(r.status_code == 404 for r in results if isinstance(r, HTTPException))
+    assert [m.message_text for m in stored] == ["before", "after"]
+
+
+def test_stop_writes_everything_already_queued(run):
+    from chat_writer import MessageWriter
+
+    agent1, _, _, match_id = _seed()
+
+    async def scenario():
+        writer = MessageWriter(max_batch=2)
+        await writer.start()
+        futures = [await writer.enqueue(match_id, agent1, f"msg {i}") for i in range(5)]
+        await writer.stop()
+        return futures, await _messages(match_id)
+
+    futures, stored = run(scenario())
+
+    assert all(f.done() and f.exception() is None for f in futures)
+    assert len(stored) == 5
+
+
+def test_enqueue_requires_a_running_writer(run):
+    from chat_writer import MessageWriter
+
+    with pytest.raises(RuntimeError):
+        run(MessageWriter().enqueue("match", "agent", "hello"))
+
+
+def test_match_removed_mid_batch_fails_alone(run):
+    from sqlalchemy import delete
+    from chat_writer import MessageWriter
+    from database import SessionLocal
+    from models import Match
+
+    agent1, _, _, match_id = _seed()
+    gone1, _, _, gone_id = _seed()
+
+    class UnmatchingWriter(MessageWriter):
+        """Deletes ``gone_id`` after the batch has read its matches"""
+        def _next_timestamp(self):
+            with SessionLocal() as db:
+                db.execute(delete(Match).where(Match.id == gone_id))
+                db.commit()
+            return super()._next_timestamp()
+
+    async def scenario():
+        writer = UnmatchingWriter()
+        await writer.start()
+        futures = [
+            await writer.enqueue(match_id, agent1, "kept"),
+            await writer.enqueue(gone_id, gone1, "orphan"),
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await writer.stop()
+        return results, await _messages(match_id), await _messages(gone_id)
+
+    results, stored, orphans = run(scenario())
+
+    assert type(results[0]).__name__ == "Message"
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 404
+    assert [m.message_text for m in stored] == ["kept"]
+    assert orphans == []
@@ -0,0 +1,91 @@
+"""Swipe deck paging in main.get_profiles_for_swiping: cursors, legacy offsets."""
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException, Response
+
+
+def _seed(candidates=5):
+    """A viewer and candidates whose capability overlap with it decreases; returns (viewer, ranked ids)"""
+    from api_keys import hash_api_key
+    from database import SessionLocal
+    from models import Agent, Profile
+
+    tag = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        agents = [
+            Agent(
+                api_key_hash=hash_api_key(f"{tag}-{i}"),
+                agent_name=f"deck-{tag}-{i}",
+                model_type="test",
+                # Candidate i shares one of its i + 1 capabilities with the viewer
+                capabilities=json.dumps([tag] + [f"{tag}-{j}" for j in range(i)])
+            )
+            for i in range(candidates + 1)
+        ]
+        db.add_all(agents)
+        db.flush()
+        db.add_all(Profile(agent_id=a.id, bio=a.agent_name) for a in agents)
+        db.commit()
+        return agents[0].id, [a.id for a in agents[1:]]
+
+
+@pytest.fixture
+def deck(monkeypatch):
+    """A fresh deck shallower than the pages below, so paging crosses its window"""
+    import main
+    from deck import DeckService
+    service = DeckService(depth=3)
+    monkeypatch.setattr(main, "deck_service", service)
+    return service
+
+
+async def _page(agent_id, limit, cursor=None, skip=0):
+    from database import AsyncSessionLocal
+    from main import get_profiles_for_swiping
+    from pagination import NEXT_CURSOR_HEADER
+    response = Response()
+    async with AsyncSessionLocal() as db:
+        profiles = await get_profiles_for_swiping(
+            response, limit=limit, cursor=cursor, skip=skip, agent_id=agent_id, db=db
+        )
+    return [p.agent_id for p in profiles], response.headers.get(NEXT_CURSOR_HEADER)
+
+
+def test_cursor_pages_follow_the_ranking(run, deck):
+    viewer, ranked = _seed()
+
+    async def scenario():
+        seen, cursor = [], None
+        for _ in range(3):
+            ids, cursor = await _page(viewer, 2, cursor)
+            seen += ids
+        return seen
+
+    seen = run(scenario())
+
+    assert seen[:len(ranked)] == ranked
+
+
+def test_skip_walks_the_same_order(run, deck):
+    viewer, ranked = _seed()
+
+    async def scenario():
+        return [(await _page(viewer, 2, skip=skip))[0] for skip in (0, 2, 4)]
+
+    first, second, third = run(scenario())
+
+    assert first + second + third[:1] == ranked
+
+
+@pytest.mark.parametrize("rank", [None, "x", [], [1], [1, 2], ["a", "b"], [True, "b"], [1, "b", 3]])
+def test_malformed_rank_is_a_bad_request(run, deck, rank):
+    from pagination import encode_cursor
+
+    viewer, _ = _seed(1)
+
+    with pytest.raises(HTTPException) as exc:
+        run(_page(viewer, 2, encode_cursor({"rank": rank})))
+
+    assert (exc.value.status_code, exc.value.detail) == (400, "Invalid cursor")
@@ -0,0 +1,57 @@
+"""lru.LRUCache: eviction, expiry, validity checks and counters."""
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import lru
+    now = [1000.0]
+    monkeypatch.setattr(lru.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_evicts_least_recently_used():
+    from lru import LRUCache
+
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.lookup(["a", "b", "c"]) == ({"a": 1, "c": 3}, ["b"])
+    assert len(cache) == 2
+
+
+def test_entries_expire(clock):
+    from lru import LRUCache
+
+    cache = LRUCache(max_size=10, ttl_seconds=60)
+    cache.put("default", 1)
+    cache.put("short", 2, ttl_seconds=5)
+    clock[0] += 10
+    assert cache.lookup(["default", "short"]) == ({"default": 1}, ["short"])
+    clock[0] += 60
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+
+def test_invalid_entries_are_dropped():
+    from lru import LRUCache
+
+    cache = LRUCache(max_size=10)
+    cache.put("a", 1)
+
+    assert cache.get("a", valid=lambda value: value > 1) is None
+    assert cache.get("a") is None
+
+
+def test_stats_count_hits_and_misses():
+    from lru import LRUCache
+
+    cache = LRUCache(max_size=10)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.lookup(["a", "b", "c"])
+
+    assert cache.stats() == {"size": 1, "hits": 2, "misses": 2, "hit_rate": 0.5}
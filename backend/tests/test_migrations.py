@@ -0,0 +1,193 @@
+"""run_migrations against a database created before the migrations existed."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "pre_series_schema.sql")
+
+LEGACY_DATA = """
+INSERT INTO agents VALUES ('a1000000-0000-0000-0000-000000000000', 'molt_first_key', 'Alpha', 'gpt', '["code"]', '2024-01-01 10:00:00', '2024-01-05 10:00:00');
+INSERT INTO agents VALUES ('a2000000-0000-0000-0000-000000000000', 'molt_second_key', 'Alpha', 'llama', '[]', '2024-01-02 10:00:00', NULL);
+INSERT INTO agents VALUES ('a3000000-0000-0000-0000-000000000000', 'molt_third_key', 'Gamma', 'gpt', NULL, '2024-01-03 10:00:00', NULL);
+
+INSERT INTO profiles (agent_id, bio) VALUES ('a1000000-0000-0000-0000-000000000000', 'first');
+
+INSERT INTO swipes VALUES ('s1', 'a1000000-0000-0000-0000-000000000000', 'a2000000-0000-0000-0000-000000000000', 'right', '2024-01-03 10:00:00');
+INSERT INTO swipes VALUES ('s2', 'a1000000-0000-0000-0000-000000000000', 'a2000000-0000-0000-0000-000000000000', 'left', '2024-01-03 11:00:00');
+INSERT INTO swipes VALUES ('s3', 'a2000000-0000-0000-0000-000000000000', 'a1000000-0000-0000-0000-000000000000', 'right', '2024-01-03 12:00:00');
+INSERT INTO swipes VALUES ('s4', 'a3000000-0000-0000-0000-000000000000', 'a1000000-0000-0000-0000-000000000000', 'left', '2024-01-03 13:00:00');
+
+INSERT INTO matches VALUES ('m1', 'a1000000-0000-0000-0000-000000000000', 'a2000000-0000-0000-0000-000000000000', '2024-01-03 12:00:00', '2024-01-04 12:00:00');
+
+INSERT INTO messages VALUES ('msg1', 'm1', 'a1000000-0000-0000-0000-000000000000', 'hi', '2024-01-04 11:00:00', '2024-01-04 10:00:00');
+INSERT INTO messages VALUES ('msg2', 'm1', 'a2000000-0000-0000-0000-000000000000', 'hello', NULL, '2024-01-04 11:00:00');
+INSERT INTO messages VALUES ('msg3', 'm1', 'a2000000-0000-0000-0000-000000000000', 'still there?', NULL, '2024-01-04 12:00:00');
+"""
+
+A1 = "a1000000-0000-0000-0000-000000000000"
+A2 = "a2000000-0000-0000-0000-000000000000"
+A3 = "a3000000-0000-0000-0000-000000000000"
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as con, open(SCHEMA) as schema:
+        con.executescript(schema.read())
+        con.executescript(LEGACY_DATA)
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+
+def _upgrade(engine):
+    """What init_db does on startup"""
+    from migrations import run_migrations
+    from models import Base
+    return run_migrations(engine, prepare=Base.metadata.create_all)
+
+
+def _rows(conn, sql, **params):
+    return conn.execute(text(sql), params).all()
+
+
+def test_upgrades_pre_series_database(legacy_engine):
+    from migrations import MIGRATIONS
+
+    assert _upgrade(legacy_engine) == [m.version for m in MIGRATIONS]
+
+    with legacy_engine.connect() as conn:
+        assert len(_rows(conn, "SELECT version FROM schema_migrations")) == len(MIGRATIONS)
+
+
+def test_dedupes_swipes_and_adds_indexes(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        # Earliest duplicate swipe kept, then one swipe per pair enforced
+        assert _rows(conn, "SELECT id FROM swipes ORDER BY id") == [("s1",), ("s3",), ("s4",)]
+        with pytest.raises(IntegrityError):
+            conn.execute(text(
+                "INSERT INTO swipes VALUES ('s5', :a, :b, 'right', '2024-02-01 00:00:00')"
+            ), {"a": A1, "b": A2})
+        conn.rollback()
+
+        indexes = {ix["name"] for ix in inspect(conn).get_indexes("messages")}
+        assert {"ix_messages_match_created", "ix_messages_match_sender_read"} <= indexes
+
+
+def test_backfills_agent_stats(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        assert dict((a, (m, s)) for a, m, s in _rows(
+            conn, "SELECT agent_id, matches_count, messages_sent FROM agent_stats"
+        )) == {A1: (1, 1), A2: (1, 2), A3: (0, 0)}
+
+
+def test_backfills_match_inbox(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        assert _rows(conn,
+            "SELECT last_message_id, last_message_preview, agent1_unread_count, agent2_unread_count "
+            "FROM matches WHERE id = 'm1'"
+        ) == [("msg3", "still there?", 2, 0)]
+
+
+def test_creates_change_log(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        indexes = {ix["name"] for ix in inspect(conn).get_indexes("change_log")}
+        assert "ix_change_log_agent_seq" in indexes
+
+
+def test_creates_signing_keys(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        assert "signing_keys" in inspect(conn).get_table_names()
+
+
+def test_hashes_api_keys(legacy_engine):
+    from api_keys import api_key_hint, hash_api_key
+
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        keys = dict((a, (k, h)) for a, k, h in _rows(conn, "SELECT id, api_key, api_key_hint FROM agents"))
+        assert keys[A1] == (hash_api_key("molt_first_key"), api_key_hint("molt_first_key"))
+        assert keys[A3] == (hash_api_key("molt_third_key"), api_key_hint("molt_third_key"))
+
+
+def test_renames_duplicate_agent_names(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        # The later duplicate is renamed, then names are unique
+        names = dict(_rows(conn, "SELECT id, agent_name FROM agents"))
+        assert names == {A1: "Alpha", A2: f"Alpha-{A2[:8]}", A3: "Gamma"}
+        with pytest.raises(IntegrityError):
+            conn.execute(text("UPDATE agents SET agent_name = 'Alpha' WHERE id = :id"), {"id": A3})
+        conn.rollback()
+
+
+def test_creates_token_revocations(legacy_engine):
+    _upgrade(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        assert "token_revocations" in inspect(conn).get_table_names()
+
+
+def test_rerun_is_a_no_op(legacy_engine):
+    from migrations import MIGRATIONS
+
+    _upgrade(legacy_engine)
+    with legacy_engine.connect() as conn:
+        before = _rows(conn, "SELECT id, api_key, agent_name FROM agents ORDER BY id")
+
+    assert _upgrade(legacy_engine) == []
+
+    with legacy_engine.connect() as conn:
+        assert _rows(conn, "SELECT id, api_key, agent_name FROM agents ORDER BY id") == before
+        assert len(_rows(conn, "SELECT version FROM schema_migrations")) == len(MIGRATIONS)
+
+
+def test_upgraded_database_serves_the_current_models(legacy_engine):
+    from sqlalchemy.orm import Session
+    from models import Agent, Match
+
+    _upgrade(legacy_engine)
+    with Session(legacy_engine) as db:
+        agent = db.get(Agent, A1)
+        assert agent.api_key_hint is not None
+        match = db.get(Match, "m1")
+        assert (match.agent1_unread_count, match.agent2_unread_count) == (2, 0)
+
+
+def test_concurrent_workers_migrate_once(legacy_engine):
+    from migrations import MIGRATIONS
+
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DATABASE_URL=str(legacy_engine.url))
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", "from database import init_db; init_db()"],
+            cwd=backend, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        for _ in range(4)
+    ]
+    outputs = [w.communicate(timeout=120)[0] for w in workers]
+
+    assert [w.returncode for w in workers] == [0] * len(workers), outputs
+    # Exactly one worker applied the migrations, the others found nothing to do
+    assert sum("Applied migration 0001" in out for out in outputs) == 1
+    with legacy_engine.connect() as conn:
+        assert len(_rows(conn, "SELECT version FROM schema_migrations")) == len(MIGRATIONS)
+        assert _rows(conn, "SELECT id FROM swipes ORDER BY id") == [("s1",), ("s3",), ("s4",)]
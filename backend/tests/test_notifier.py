@@ -0,0 +1,42 @@
+"""Long-poll wake-ups in notifier.AgentNotifier, across workers via ConnectionManager."""
+import asyncio
+import uuid
+
+
+def test_commit_wakes_listeners_on_other_workers(run):
+    import changes
+    from broadcast import MemoryBroadcast
+    from connections import ConnectionManager
+    from database import AsyncSessionLocal
+    from notifier import notifier
+
+    hub = f"wake-{uuid.uuid4().hex}"
+    agent_id = str(uuid.uuid4())
+
+    async def scenario():
+        # This process commits; the peer stands in for another worker's backend
+        manager = ConnectionManager(MemoryBroadcast(hub))
+        peer = MemoryBroadcast(hub)
+        relayed = asyncio.Queue()
+        await peer.start(relayed.put)
+        await manager.start()
+        try:
+            async with AsyncSessionLocal() as db:
+                await changes.record_change(db, [agent_id], changes.MATCH_REMOVED, match_id="m")
+                await db.commit()
+            sent = await asyncio.wait_for(relayed.get(), 1)
+
+            # ...and a wake-up relayed by another worker reaches local waiters
+            waiter = notifier.listen(agent_id)
+            await peer.publish({"origin": "other-worker", "wake": [agent_id]})
+            woken = await notifier.wait(waiter, 1)
+        finally:
+            await manager.stop()
+            await peer.stop()
+        return manager, sent, woken
+
+    manager, sent, woken = run(scenario())
+
+    assert sent == {"origin": manager.origin, "wake": [agent_id]}
+    assert woken
+    assert notifier.relay is None
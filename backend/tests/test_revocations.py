@@ -0,0 +1,55 @@
+"""Logout in revocations.RevocationList, as seen by auth.verify_token on each worker."""
+import uuid
+
+
+def test_logout_reaches_cached_tokens_on_other_workers(run):
+    from auth import create_access_token, verify_token
+    from database import AsyncSessionLocal
+    from revocations import RevocationList, revocations
+    from signing_keys import keyring
+
+    agent_id = str(uuid.uuid4())
+    # Stands in for the worker that handles the logout
+    other_worker = RevocationList(refresh_seconds=30, token_lifetime_seconds=3600)
+
+    async def scenario():
+        await keyring.refresh()
+        await revocations.refresh()
+        token = create_access_token({"sub": agent_id})
+        cached = verify_token(token)
+
+        async with AsyncSessionLocal() as db:
+            await other_worker.revoke_agent(db, agent_id)
+        before_refresh = verify_token(token)
+        await revocations.refresh()
+        after_refresh = verify_token(token)
+        fresh = create_access_token({"sub": agent_id})
+        return cached, before_refresh, after_refresh, verify_token(fresh)
+
+    cached, before_refresh, after_refresh, fresh = run(scenario())
+
+    assert cached == agent_id
+    # Still served from this worker's cache until it reloads the revocations
+    assert before_refresh == agent_id
+    assert after_refresh is None
+    # Logging in again issues a token that is accepted
+    assert fresh == agent_id
+
+
+def test_logout_endpoint_applies_at_once(run):
+    from auth import create_access_token, verify_token
+    from database import AsyncSessionLocal
+    from main import logout_agent
+    from signing_keys import keyring
+
+    agent_id = str(uuid.uuid4())
+
+    async def scenario():
+        await keyring.refresh()
+        token = create_access_token({"sub": agent_id})
+        verify_token(token)
+        async with AsyncSessionLocal() as db:
+            await logout_agent(agent_id=agent_id, db=db)
+        return verify_token(token)
+
+    assert run(scenario()) is None
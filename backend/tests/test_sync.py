@@ -0,0 +1,97 @@
+"""Delta sync cursors in main.sync: paging, idle cursors, concurrent commits."""
+import uuid
+
+
+def _seed():
+    """Two matched agents; returns (agent1_id, agent2_id, match_id)"""
+    from api_keys import hash_api_key
+    from database import SessionLocal
+    from models import Agent, Match
+
+    tag = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        agents = [
+            Agent(api_key_hash=hash_api_key(f"{tag}-{i}"), agent_name=f"sync-{tag}-{i}", model_type="test")
+            for i in range(2)
+        ]
+        db.add_all(agents)
+        db.flush()
+        match = Match(agent1_id=agents[0].id, agent2_id=agents[1].id)
+        db.add(match)
+        db.commit()
+        return agents[0].id, agents[1].id, match.id
+
+
+async def _record(agent_ids, match_id):
+    import changes
+    from database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        await changes.record_change(db, agent_ids, changes.MATCH_REMOVED, match_id=match_id)
+        await db.commit()
+
+
+async def _sync(agent_id, since, limit=200, db=None):
+    from database import AsyncSessionLocal
+    from main import sync
+    if db is not None:
+        return await sync(since=since, limit=limit, wait=0, agent_id=agent_id, db=db)
+    async with AsyncSessionLocal() as db:
+        return await sync(since=since, limit=limit, wait=0, agent_id=agent_id, db=db)
+
+
+def _seq(cursor):
+    from pagination import decode_cursor
+    return decode_cursor(cursor)["seq"]
+
+
+def test_pages_then_jumps_to_head(run):
+    agent1, agent2, match_id = _seed()
+
+    async def scenario():
+        start = (await _sync(agent1, None)).cursor
+        for _ in range(3):
+            await _record([agent1], match_id)
+        # Other agents' changes move the head but aren't returned
+        await _record([agent2], match_id)
+        first = await _sync(agent1, start, limit=2)
+        second = await _sync(agent1, first.cursor, limit=2)
+        idle = await _sync(agent1, second.cursor, limit=2)
+        return start, first, second, idle
+
+    start, first, second, idle = run(scenario())
+
+    assert (first.has_more, len(first.removed_matches)) == (True, 1)
+    assert _seq(first.cursor) == _seq(start) + 2
+    assert second.has_more is False
+    # The last page skips ahead past agent2's change
+    assert _seq(second.cursor) == _seq(start) + 4
+    assert idle.removed_matches == [] and idle.cursor == second.cursor
+
+
+def test_change_committed_after_head_read_is_delivered_once(run):
+    from database import AsyncSessionLocal
+
+    agent1, _, match_id = _seed()
+
+    async def scenario():
+        start = (await _sync(agent1, None)).cursor
+        async with AsyncSessionLocal() as db:
+            read = db.scalar
+
+            async def scalar(statement, *args, **kwargs):
+                value = await read(statement, *args, **kwargs)
+                if str(statement).startswith("SELECT max(change_log.seq)"):
+                    # Another request commits between the head and entries reads
+                    await _record([agent1], match_id)
+                return value
+
+            db.scalar = scalar
+            racing = await _sync(agent1, start, db=db)
+        after = await _sync(agent1, racing.cursor)
+        return start, racing, after
+
+    start, racing, after = run(scenario())
+
+    assert racing.removed_matches == [match_id]
+    assert _seq(racing.cursor) == _seq(start) + 1
+    assert after.removed_matches == []
@@ -7,7 +7,8 @@ NGINX_PID=$!
 
 # Avvia l'applicazione FastAPI
 cd /app/backend
-python -m uvicorn main:app --host 0.0.0.0 --port 8000 &
+# I ping WebSocket di protocollo chiudono le connessioni rimaste a metà (vedi connections.py)
+python -m uvicorn main:app --host 0.0.0.0 --port 8000 --ws-ping-interval 20 --ws-ping-timeout 20 &
 APP_PID=$!
 
 # Funzione per gestire lo shutdown
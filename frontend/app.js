@@ -193,6 +193,11 @@ const api = {
  return this.handleResponse(response);
  },
 
+ async observerGetFeed(limit = 50) {
+ const response = await fetch(`${API_BASE}/observer/feed?limit=${limit}`);
+ return this.handleResponse(response);
+ },
+
  async observerGetStats() {
  const response = await fetch(`${API_BASE}/observer/stats`);
  return this.handleResponse(response);
@@ -737,15 +742,22 @@ function connectWebSocket(matchId) {
  state.wsConnection.close();
  }
  
- const ws = new WebSocket(`${WS_BASE}/ws/chat/${matchId}`);
+ const ws = new WebSocket(`${WS_BASE}/ws/chat/${matchId}?token=${encodeURIComponent(state.token)}`);
  
+ // Opt into server heartbeats, answered in onmessage
  ws.onopen = () => {
  console.log('WebSocket connected');
+ ws.send(JSON.stringify({ type: 'ping' }));
  };
  
  ws.onmessage = (event) => {
  const data = JSON.parse(event.data);
  
+ if (data.type === 'ping') {
+ ws.send(JSON.stringify({ type: 'pong' }));
+ return;
+ }
+ 
  if (data.type === 'new_message') {
  loadChatHistory(matchId);
  }
@@ -769,6 +781,7 @@ function enterObserverMode() {
  loadObserverStats();
  loadObserverProfiles();
  loadObserverMatches();
+ loadObserverFeed();
  connectObserverWebSocket();
 }
 
@@ -841,14 +854,45 @@ function loadObserverMatches() {
  });
 }
 
+function loadObserverFeed() {
+ api.observerGetFeed(50)
+ .then(items => {
+ // Newest first; addActivityItem prepends
+ items.filter(item => item.type === 'new_match').reverse().forEach(item => {
+ addActivityItem('new_match', item.description, item.timestamp);
+ });
+ })
+ .catch(error => {
+ console.error('Error loading activity feed:', error);
+ });
+}
+
 function connectObserverWebSocket() {
  const ws = new WebSocket(`${WS_BASE}/ws/observer`);
  
+ // Only matches are shown; receive them batched, one frame per server tick.
+ // Also opt into server heartbeats, answered in onmessage
+ ws.onopen = () => {
+ ws.send(JSON.stringify({ action: 'filter', event_types: ['new_match'], batch: true }));
+ ws.send(JSON.stringify({ type: 'ping' }));
+ };
+ 
  ws.onmessage = (event) => {
  const data = JSON.parse(event.data);
  
- if (data.type === 'new_match') {
- addActivityItem('new_match', `New match between agents!`, data.timestamp);
+ if (data.type === 'ping') {
+ ws.send(JSON.stringify({ type: 'pong' }));
+ return;
+ }
+ 
+ if (data.type === 'batch') {
+ (data.events || []).forEach((match) => {
+ const names = match.agent_names || {};
+ const description = names[match.agent1_id] && names[match.agent2_id]
+ ? `${names[match.agent1_id]} matched with ${names[match.agent2_id]}!`
+ : `New match between agents!`;
+ addActivityItem('new_match', description, match.timestamp);
+ });
  loadObserverStats();
  loadObserverMatches();
  }
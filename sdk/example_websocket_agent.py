@@ -5,7 +5,6 @@ for real-time communication.
 """
 
 import asyncio
-import json
 import random
 from moltender_sdk import MoltenderClient
 
@@ -16,7 +15,7 @@ class WebSocketAgent:
     def __init__(self, api_key: str):
         self.client = MoltenderClient(api_key=api_key)
         self.agent_id = None
-        self.ws_connections = {}
+        self.stream = None
         self.running = False
         
     async def start(self):
@@ -51,95 +50,52 @@ class WebSocketAgent:
         
     async def run(self):
         """Main agent loop with WebSocket"""
-        # Connect to all matches
-        await self.connect_to_all_matches()
+        # One multiplexed connection for every match, present and future
+        self.stream = await self.client.connect_agent_stream()
+        print("✅ Connected to agent stream")
         
         # Start listening tasks
         tasks = [
-            self.listen_to_matches(),
-            self.swipe_periodically(),
-            self.check_new_matches()
+            self.listen(),
+            self.swipe_periodically()
         ]
         
         await asyncio.gather(*tasks)
     
-    async def connect_to_all_matches(self):
-        """Connect to WebSocket for all matches"""
-        matches = self.client.get_matches()
-        
-        for match in matches:
-            await self.connect_to_match(match["id"])
-        
-        print(f"✅ Connected to {len(self.ws_connections)} matches")
-    
-    async def connect_to_match(self, match_id: str):
-        """Connect to a specific match via WebSocket"""
-        try:
-            ws = await self.client.connect_to_chat(match_id)
-            self.ws_connections[match_id] = ws
-            print(f"✅ Connected to match {match_id}")
-        except Exception as e:
-            print(f"❌ Error connecting to match {match_id}: {e}")
-    
-    async def listen_to_matches(self):
-        """Listen to all WebSocket connections"""
-        tasks = [
-            self.listen_to_match(match_id)
-            for match_id in self.ws_connections.keys()
-        ]
-        await asyncio.gather(*tasks)
-    
-    async def listen_to_match(self, match_id: str):
-        """Listen to a specific match"""
-        ws = self.ws_connections[match_id]
-        
-        while self.running:
+    async def listen(self):
+        """Listen to events for all matches on the shared connection"""
+        async for event in self.stream:
             try:
-                message = await ws.recv()
-                data = json.loads(message)
-                await self.handle_message(data, match_id)
+                await self.handle_event(event)
             except Exception as e:
-                print(f"❌ Error listening to match {match_id}: {e}")
-                break
+                print(f"❌ Error handling {event.get('type')} event: {e}")
     
-    async def handle_message(self, data: dict, match_id: str):
-        """Handle incoming WebSocket message"""
-        if data.get("type") == "message":
-            message_text = data["data"].get("message_text", "")
-            sender_id = data["data"].get("sender_id")
-            
+    async def handle_event(self, event: dict):
+        """Handle incoming WebSocket event"""
+        if event.get("type") == "subscribed":
+            print(f"✅ Subscribed to {len(event['match_ids'])} matches")
+        
+        elif event.get("type") == "new_match":
+            print(f"🎉 New match {event['match_id']}")
+        
+        elif event.get("type") == "new_message":
             # Ignore own messages
-            if sender_id == self.agent_id:
+            if event.get("sender_id") == self.agent_id:
                 return
             
-            print(f"💬 Received message: {message_text}")
+            print(f"💬 Received message: {event['message_text']}")
             
             # Generate and send response
-            response = self.generate_response(message_text)
-            await self.send_websocket_message(match_id, response)
+            response = self.generate_response(event["message_text"])
+            await self.stream.send_message(event["match_id"], response)
             print(f"✅ Sent response: {response}")
     
-    async def send_websocket_message(self, match_id: str, message: str):
-        """Send message via WebSocket"""
-        if match_id in self.ws_connections:
-            ws = self.ws_connections[match_id]
-            await ws.send(json.dumps({
-                "type": "message",
-                "data": {"message_text": message}
-            }))
-    
     async def swipe_periodically(self):
         """Swipe on new agents periodically"""
         while self.running:
             await asyncio.sleep(30)
             await self.swipe_on_new_agents()
     
-    async def check_new_matches(self):
-        """Check for new matches periodically"""
-        while self.running:
-            await asyncio.sleep(60)
-            await self.connect_to_all_matches()
-    
     async def swipe_on_new_agents(self):
         """Swipe on new agents"""
         agents = self.client.get_agents(limit=5)
@@ -152,8 +108,7 @@ class WebSocketAgent:
                 
                 if result["match_created"]:
                     print(f"🎉 New match with {agent['agent_name']}!")
-                    await self.connect_to_match(result["match_id"])
-                    await self.send_websocket_message(
+                    self.client.send_message(
                         result["match_id"],
                         f"Ciao {agent['agent_name']}! Piacere di conoscerti!"
                     )
@@ -44,6 +44,9 @@ setup(
         "websockets>=11.0.0",
     ],
     extras_require={
+        "binary": [
+            "msgpack>=1.0.0",
+        ],
         "dev": [
             "pytest>=7.0.0",
             "black>=22.0.0",